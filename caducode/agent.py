@@ -6,47 +6,82 @@ from typing import Any
 
 from pydantic_ai import Agent, RunContext
 
+from .cache import ResponseCache
 from .config import create_ollama_model
-from .execution import execute_python
+from .execution import CancelToken, Executor
+from .failures import FailureTracker
 from .printer import Printer
+from .profiling import ProfileOptions, split_profile
 from .prompts import create_system_prompt
+from .tokens import TokenAccounting
 
 
-def create_agent(base_url: str, model_name: str, printer: Printer) -> Agent[None, str]:
+def create_agent(
+    base_url: str,
+    model_name: str,
+    printer: Printer,
+    executor: Executor,
+    cancel: CancelToken | None = None,
+    cache: ResponseCache | None = None,
+    profile: ProfileOptions | None = None,
+    accounting: TokenAccounting | None = None,
+) -> Agent[None, str]:
     """Create and configure the PydanticAI agent.
 
     Args:
         base_url: Ollama API base URL.
         model_name: Name of the model to use.
         printer: Printer instance for output.
+        executor: Backend running the generated code.
+        cancel: Token used to cancel the running snippet, e.g. on Ctrl+C.
+        cache: Response cache to answer identical model requests from.
+        profile: Profile each snippet and show it with the code.
+        accounting: Token accounting estimating and recording every request.
 
     Returns:
         Configured PydanticAI agent.
     """
-    model = create_ollama_model(base_url, model_name)
+    model = create_ollama_model(base_url, model_name, cache, accounting)
 
     agent: Agent[None, str] = Agent(
         model=model,
-        system_prompt=create_system_prompt(),
+        system_prompt=create_system_prompt(what_if=executor.supports_what_if),
     )
 
+    failures = FailureTracker()
+
     @agent.tool
-    def run_python(ctx: RunContext[None], code: str, description: str) -> list[Any]:
+    def run_python(
+        ctx: RunContext[None],
+        code: str,
+        description: str,
+        what_if: bool = False,
+    ) -> list[Any]:
         """Execute arbitrary Python code in a persistent environment.
 
         Args:
             ctx: PydanticAI run context (required).
             code: Python code to execute.
             description: Short description of what this code does (shown to user).
+            what_if: Run in a disposable copy of the environment, kept only on _commit().
 
         Returns:
             List of values passed to _return(), or error traceback if exception raised.
         """
-        del ctx  # Unused but required by PydanticAI
-
         printer.code(code, description)
         printer.debug_msg("TOOL CALL", "run_python")
 
-        return execute_python(code, printer)
+        result = executor.execute(
+            code,
+            printer,
+            on_output=printer.output,
+            cancel=cancel,
+            what_if=what_if,
+            profile=profile,
+        )
+        _, report = split_profile(result)
+        if report is not None:
+            printer.profile(report)
+        return failures.check(ctx.run_id, result)
 
     return agent
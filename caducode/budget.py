@@ -0,0 +1,263 @@
+"""Per-turn and per-session budgets for agent runs."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, fields
+from typing import Any
+
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import UsageLimitExceeded
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.run import AgentRun
+from pydantic_ai.usage import RunUsage, UsageLimits
+
+from .config import MODEL_SETTINGS
+from .exceptions import BudgetExhaustedError, RepeatedFailureError
+from .utils import format_tokens
+
+
+@dataclass
+class Limits:
+    """Usage limits, None meaning unlimited.
+
+    Attributes:
+        requests: Model requests.
+        tool_calls: Tool calls.
+        input_tokens: Input tokens, summed over all requests.
+        output_tokens: Output tokens.
+        seconds: Wall time, checked between agent steps (a running snippet
+            is not interrupted).
+    """
+
+    requests: int | None = None
+    tool_calls: int | None = None
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    seconds: float | None = None
+
+
+LIMIT_KEYS = tuple(f.name for f in fields(Limits))
+
+
+def parse_limits(spec: str) -> Limits:
+    """Parse limits given as comma-separated key=value pairs.
+
+    Example: "requests=30,tool_calls=20,seconds=300".
+
+    Raises:
+        ValueError: If a key is unknown or a value is not a positive number.
+    """
+    values: dict[str, Any] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        key, sep, value = (part.strip() for part in item.partition("="))
+        if not sep or key not in LIMIT_KEYS:
+            raise ValueError(f"Unknown limit '{item.strip()}' (use {', '.join(LIMIT_KEYS)})")
+        try:
+            number = float(value) if key == "seconds" else int(value)
+        except ValueError:
+            raise ValueError(f"Limit {key} must be a number, got '{value}'") from None
+        if number <= 0:
+            raise ValueError(f"Limit {key} must be positive, got '{value}'")
+        values[key] = number
+    return Limits(**values)
+
+
+def _remaining(limit: int | None, used: int) -> int | None:
+    return None if limit is None else max(limit - used, 0)
+
+
+def _smallest(a: int | None, b: int | None) -> int | None:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+class Budget:
+    """Limits applied to each turn and to the whole session.
+
+    Each turn gets its own limits, capped by what is left of the session limits.
+    """
+
+    def __init__(self, turn: Limits | None = None, session: Limits | None = None) -> None:
+        self.turn = turn or Limits()
+        self.session = session or Limits()
+        self.usage = RunUsage()
+        self.seconds = 0.0
+
+    def _left(self, limits: Limits, usage: RunUsage, seconds: float) -> Limits:
+        return Limits(
+            requests=_remaining(limits.requests, usage.requests),
+            tool_calls=_remaining(limits.tool_calls, usage.tool_calls),
+            input_tokens=_remaining(limits.input_tokens, usage.input_tokens),
+            output_tokens=_remaining(limits.output_tokens, usage.output_tokens),
+            seconds=None if limits.seconds is None else max(limits.seconds - seconds, 0.0),
+        )
+
+    def for_turn(self) -> Limits:
+        """Limits of the next turn: the turn limits capped by what is left of the session."""
+        session = self._left(self.session, self.usage, self.seconds)
+        return Limits(
+            requests=_smallest(self.turn.requests, session.requests),
+            tool_calls=_smallest(self.turn.tool_calls, session.tool_calls),
+            input_tokens=_smallest(self.turn.input_tokens, session.input_tokens),
+            output_tokens=_smallest(self.turn.output_tokens, session.output_tokens),
+            seconds=min(
+                (s for s in (self.turn.seconds, session.seconds) if s is not None),
+                default=None,
+            ),
+        )
+
+    def exhausted(self) -> str | None:
+        """Name of the first session limit used up, None if a new turn can start."""
+        session = self._left(self.session, self.usage, self.seconds)
+        for key in LIMIT_KEYS:
+            if getattr(session, key) == 0:
+                return key
+        return None
+
+    def add(self, usage: RunUsage, seconds: float) -> None:
+        """Charge a turn to the session."""
+        self.usage.incr(usage)
+        self.seconds += seconds
+
+    def describe_remaining(self, usage: RunUsage | None = None, seconds: float = 0.0) -> str:
+        """Short description of what is left of the turn budget, "" when unlimited.
+
+        Args:
+            usage: Usage of the running turn so far, if any.
+            seconds: Time spent in the running turn so far.
+        """
+        left = self._left(self.for_turn(), usage or RunUsage(), seconds)
+        parts = []
+        if left.requests is not None:
+            parts.append(f"{left.requests} req")
+        if left.tool_calls is not None:
+            parts.append(f"{left.tool_calls} tools")
+        if left.input_tokens is not None:
+            parts.append(f"{format_tokens(left.input_tokens)} in")
+        if left.output_tokens is not None:
+            parts.append(f"{format_tokens(left.output_tokens)} out")
+        if left.seconds is not None:
+            parts.append(f"{left.seconds:.0f}s")
+        return f"left: {' · '.join(parts)}" if parts else ""
+
+
+@dataclass
+class TurnResult:
+    """Outcome of a turn.
+
+    Attributes:
+        output: Final answer, or the last text the model produced if the turn was stopped.
+        messages: Message history to continue the conversation with.
+        usage: Usage of the turn.
+        stopped: Why the turn was stopped early (budget or repeated failure), None if
+            it completed.
+    """
+
+    output: str
+    messages: list[ModelMessage]
+    usage: RunUsage
+    stopped: str | None = None
+
+
+def _partial_output(messages: list[ModelMessage]) -> str:
+    """Text of the last model response that contained any."""
+    for message in reversed(messages):
+        if isinstance(message, ModelResponse):
+            text = "".join(part.content for part in message.parts if isinstance(part, TextPart))
+            if text.strip():
+                return text
+    return ""
+
+
+def _resumable(messages: list[ModelMessage]) -> list[ModelMessage]:
+    """Drop trailing tool calls that were never answered, so the history can be continued."""
+    messages = list(messages)
+    while (
+        messages
+        and isinstance(messages[-1], ModelResponse)
+        and any(isinstance(part, ToolCallPart) for part in messages[-1].parts)
+    ):
+        messages.pop()
+    return messages
+
+
+async def run_turn(
+    agent: Agent[None, str],
+    prompt: str,
+    budget: Budget,
+    *,
+    message_history: list[ModelMessage] | None = None,
+    on_step: Callable[[RunUsage, float], None] | None = None,
+) -> TurnResult:
+    """Run the agent for one user message within the budget.
+
+    When a limit is hit, or the model keeps repeating a failing snippet (see
+    FailureTracker), the run is stopped and the result holds the last text the
+    model produced; the history is trimmed so the next turn can continue it.
+
+    Args:
+        agent: Agent to run.
+        prompt: User message.
+        budget: Budget the turn is charged to.
+        message_history: Messages of the previous turns.
+        on_step: Callback receiving the turn usage and elapsed seconds after each
+            agent step, e.g. to display the remaining budget.
+
+    Returns:
+        TurnResult of the turn.
+
+    Raises:
+        BudgetExhaustedError: If the session budget was already used up.
+    """
+    reason = budget.exhausted()
+    if reason is not None:
+        raise BudgetExhaustedError(f"{reason} limit reached")
+
+    limits = budget.for_turn()
+    usage_limits = UsageLimits(
+        request_limit=limits.requests,
+        tool_calls_limit=limits.tool_calls,
+        input_tokens_limit=limits.input_tokens,
+        output_tokens_limit=limits.output_tokens,
+    )
+    stopped: str | None = None
+    run: AgentRun[None, str] | None = None
+    start = time.monotonic()
+
+    try:
+        async with agent.iter(
+            prompt,
+            message_history=message_history,
+            model_settings=MODEL_SETTINGS,
+            usage_limits=usage_limits,
+        ) as run:
+            async for _node in run:
+                elapsed = time.monotonic() - start
+                if on_step is not None:
+                    on_step(run.usage(), elapsed)
+                if limits.seconds is not None and elapsed >= limits.seconds and run.result is None:
+                    stopped = f"Time limit of {limits.seconds:.0f}s reached"
+                    break
+    except (UsageLimitExceeded, RepeatedFailureError) as e:
+        stopped = str(e)
+    finally:
+        if run is not None:
+            budget.add(run.usage(), time.monotonic() - start)
+
+    if run is None:
+        raise RuntimeError("Agent run did not start")
+    if stopped is None and run.result is not None:
+        return TurnResult(run.result.output, run.all_messages(), run.usage())
+    return TurnResult(
+        output=_partial_output(run.new_messages()),
+        messages=_resumable(run.all_messages()),
+        usage=run.usage(),
+        stopped=stopped,
+    )
@@ -0,0 +1,235 @@
+"""Content-addressed on-disk cache of model responses, with record/replay modes."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal
+
+from pydantic import TypeAdapter
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelResponse
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+
+from .exceptions import CacheMissError
+
+CacheMode = Literal["passthrough", "record", "replay"]
+CACHE_MODES: tuple[CacheMode, ...] = ("passthrough", "record", "replay")
+
+# Message and part fields that change between otherwise identical requests
+VOLATILE_FIELDS = frozenset({
+    "timestamp", "run_id", "tool_call_id", "provider_response_id", "usage",
+})
+# Settings that don't affect the response
+IGNORED_SETTINGS = frozenset({"timeout"})
+# Serialized responses kept in memory, so hot entries skip the disk
+MEMORY_ENTRIES = 128
+
+_parameters_adapter = TypeAdapter(ModelRequestParameters)
+
+
+def _strip_volatile(message: dict[str, Any]) -> dict[str, Any]:
+    """Drop volatile fields of a serialized message and its parts, never of their content."""
+    stripped = {k: v for k, v in message.items() if k not in VOLATILE_FIELDS}
+    stripped["parts"] = [
+        {k: v for k, v in part.items() if k not in VOLATILE_FIELDS}
+        for part in message.get("parts", [])
+    ]
+    return stripped
+
+
+def request_key(
+    model_name: str,
+    messages: list[ModelMessage],
+    model_settings: ModelSettings | None,
+    parameters: ModelRequestParameters,
+) -> str:
+    """Hash identifying a model request.
+
+    Timestamps, run ids and tool call ids are left out, so replaying a session
+    produces the same keys as recording it.
+    """
+    settings = {k: v for k, v in (model_settings or {}).items() if k not in IGNORED_SETTINGS}
+    payload = {
+        "model": model_name,
+        "settings": settings,
+        "parameters": _parameters_adapter.dump_python(parameters, mode="json"),
+        "messages": [
+            _strip_volatile(message)
+            for message in ModelMessagesTypeAdapter.dump_python(messages, mode="json")
+        ],
+    }
+    data = json.dumps(payload, sort_keys=True, default=repr)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Response cache counters."""
+
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    """Model responses stored as one JSON file per request key.
+
+    The directory is bounded to `max_bytes`: when a new entry makes it larger,
+    the least recently used entries (by modification time, refreshed on hits)
+    are deleted.
+
+    Modes:
+        passthrough: The cache is not used.
+        record: Cached responses are returned, others are fetched and stored.
+        replay: Only cached responses are returned, a miss raises CacheMissError.
+    """
+
+    def __init__(self, directory: Path, mode: CacheMode = "record", max_bytes: int = 0) -> None:
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._size: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether lookups go through the cache."""
+        return self.mode != "passthrough"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _remember(self, key: str, data: bytes) -> None:
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> ModelResponse | None:
+        """Return the cached response for a key, counting a hit or a miss."""
+        data = self._memory.get(key)
+        path = self._path(key)
+        if data is None:
+            try:
+                data = path.read_bytes()
+            except OSError:
+                self.stats.misses += 1
+                return None
+        try:
+            (response,) = ModelMessagesTypeAdapter.validate_json(data)
+        except ValueError:
+            # Corrupt or written by an incompatible version: treat as a miss
+            self.stats.misses += 1
+            return None
+        if not isinstance(response, ModelResponse):
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        self._remember(key, data)
+        with suppress(OSError):
+            os.utime(path)
+        return response
+
+    def put(self, key: str, response: ModelResponse) -> None:
+        """Store a response, evicting old entries if the directory gets too large."""
+        data = ModelMessagesTypeAdapter.dump_json([response])
+        path = self._path(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        except OSError:
+            return
+        self.stats.stores += 1
+        self._remember(key, data)
+        if self._size is not None:
+            self._size += len(data)
+        self._evict()
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        if self._size is not None and self._size <= self.max_bytes:
+            return
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        self._size = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._size -= size
+            self._memory.pop(path.stem, None)
+            self.stats.evictions += 1
+
+    def describe(self) -> str:
+        """One-line cache status, shown to the user."""
+        if not self.enabled:
+            return "Response cache: off"
+        stats = self.stats
+        return (
+            f"Response cache: {self.mode} in {self.directory}, "
+            f"{stats.hits} hits / {stats.misses} misses ({stats.hit_rate:.0%})"
+        )
+
+
+class CachedModel(WrapperModel):
+    """Model answering identical requests from a ResponseCache.
+
+    Only non-streamed requests are cached, which is how CaduCode runs the agent.
+    """
+
+    def __init__(self, wrapped: Model, cache: ResponseCache) -> None:
+        super().__init__(wrapped)
+        self.cache = cache
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        """Return the cached response, or fetch (and in record mode, store) it.
+
+        Raises:
+            CacheMissError: In replay mode, if the request is not cached.
+        """
+        if not self.cache.enabled:
+            return await self.wrapped.request(messages, model_settings, model_request_parameters)
+
+        key = request_key(self.model_name, messages, model_settings, model_request_parameters)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if self.cache.mode == "replay":
+            raise CacheMissError(key)
+
+        response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        self.cache.put(key, response)
+        return response
@@ -4,47 +4,104 @@ from __future__ import annotations
 
 import asyncio
 import sys
+from pathlib import Path
+from typing import Any
 
 import click
 
 from . import __version__
 from .agent import create_agent
-from .config import DEFAULT_MODEL, DEFAULT_OLLAMA_URL
-from .exceptions import ModelNotFoundError, OllamaConnectionError
+from .budget import Budget, parse_limits
+from .cache import CACHE_MODES, CacheMode, ResponseCache
+from .config import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CACHE_MODE,
+    DEFAULT_CACHE_SIZE_MB,
+    DEFAULT_MAX_RENDERED_LINES,
+    DEFAULT_MODEL,
+    DEFAULT_OLLAMA_URL,
+    DEFAULT_PRELOAD,
+    DEFAULT_SESSION_LIMITS,
+    DEFAULT_TURN_LIMITS,
+    DEFAULT_WARM_WORKERS,
+)
+from .debuglog import DebugLog
+from .exceptions import BackendUnavailableError, ModelNotFoundError, OllamaConnectionError
+from .execution import CancelToken, Executor, create_executor
 from .models import validate_model
 from .printer import Printer, console
+from .profiling import ProfileOptions
 from .prompts import get_cwd
 from .repl import repl, run_prompt
+from .tokens import TokenAccounting
+from .transcript import (
+    EXPORT_FORMATS,
+    ExportFormat,
+    export_transcript,
+    format_for_path,
+    read_jsonl,
+)
 
 
 async def main_repl(
     base_url: str,
     model_name: str,
     printer: Printer,
+    executor: Executor,
+    budget: Budget,
+    cache: ResponseCache,
+    profile: ProfileOptions | None = None,
     prompt: str | None = None,
 ) -> None:
     """Main entry point for Rich CLI mode."""
     printer.system(f"[bold blue]CaduCode[/bold blue] v{__version__} - Minimalist coding agent")
     printer.system(f"Model: {model_name} @ {base_url}")
     printer.system(f"Working directory: {get_cwd()}")
+    printer.system(executor.describe())
+    if cache.enabled:
+        printer.system(cache.describe())
     if printer.debug:
         printer.system("[dim cyan]Debug mode enabled[/dim cyan]")
 
-    agent = create_agent(base_url, model_name, printer)
+    cancel = CancelToken()
+    accounting = TokenAccounting()
+    agent = create_agent(
+        base_url,
+        model_name,
+        printer,
+        executor,
+        cancel,
+        cache,
+        profile,
+        accounting,
+    )
 
     if prompt:
-        await run_prompt(agent, prompt, printer)
+        await run_prompt(agent, prompt, printer, budget)
     else:
-        printer.system('Type "exit" or "quit" to exit.\n')
-        await repl(agent, printer)
+        printer.system(
+            'Type "exit" or "quit" to exit, "/tokens" for the context size; '
+            "Ctrl+C cancels the running turn.\n"
+        )
+        await repl(agent, printer, budget, cancel, accounting)
+    if cache.enabled:
+        printer.system(cache.describe())
 
 
 def run_tui(
     base_url: str,
     model_name: str,
+    executor: Executor,
+    budget: Budget,
+    cache: ResponseCache,
     *,
     debug: bool = False,
+    debug_log: DebugLog | None = None,
     show_code_results: bool = False,
+    max_rendered_lines: int | None = DEFAULT_MAX_RENDERED_LINES,
+    profile: ProfileOptions | None = None,
 ) -> None:
     """Run the Textual TUI."""
     from .ui import CaduCodeApp
@@ -53,12 +110,38 @@ def run_tui(
         base_url=base_url,
         model_name=model_name,
         debug_mode=debug,
+        debug_log=debug_log,
         show_code_results=show_code_results,
+        executor=executor,
+        max_rendered_lines=max_rendered_lines,
+        budget=budget,
+        cache=cache,
+        profile=profile,
     )
     app.run()
+    if cache.enabled:
+        console.print(cache.describe())
+
+
+class DefaultCommandGroup(click.Group):
+    """Click group running a default command when no subcommand name is given."""
+
+    def __init__(self, *args: Any, default_command: str, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
 
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if not args or args[0] not in self.commands:
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
 
-@click.command()
+
+@click.group(cls=DefaultCommandGroup, default_command="run")
+def cli() -> None:
+    """CaduCode - Minimalist coding agent with a single run_python tool."""
+
+
+@cli.command()
 @click.argument("prompt", required=False)
 @click.option(
     "--api-url",
@@ -70,17 +153,104 @@ def run_tui(
     default=DEFAULT_MODEL,
     help=f"Model to use (default: {DEFAULT_MODEL})",
 )
-@click.option("--debug", is_flag=True, help="Enable debug output")
+@click.option(
+    "--backend",
+    type=click.Choice(BACKENDS),
+    default=DEFAULT_BACKEND,
+    help=f"Code execution backend (default: {DEFAULT_BACKEND})",
+)
+@click.option(
+    "--preload",
+    default=",".join(DEFAULT_PRELOAD),
+    help=f"Comma-separated modules imported before the first snippet "
+    f"(default: {','.join(DEFAULT_PRELOAD)})",
+)
+@click.option(
+    "--warm-workers",
+    type=click.IntRange(min=0),
+    default=DEFAULT_WARM_WORKERS,
+    help=f"Pre-forked workers kept ready, fork backend only (default: {DEFAULT_WARM_WORKERS})",
+)
+@click.option(
+    "--turn-limits",
+    default=DEFAULT_TURN_LIMITS,
+    help="Limits per user message as comma-separated key=value pairs; keys: requests, "
+    f"tool_calls, input_tokens, output_tokens, seconds (default: {DEFAULT_TURN_LIMITS})",
+)
+@click.option(
+    "--session-limits",
+    default=DEFAULT_SESSION_LIMITS,
+    help="Limits for the whole session, same keys as --turn-limits (default: none)",
+)
+@click.option(
+    "--cache-mode",
+    type=click.Choice(CACHE_MODES),
+    default=DEFAULT_CACHE_MODE,
+    help="Model response cache: record stores new responses and reuses cached ones, "
+    f"replay only uses cached ones, offline (default: {DEFAULT_CACHE_MODE})",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=DEFAULT_CACHE_DIR,
+    help=f"Response cache directory (default: {DEFAULT_CACHE_DIR})",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=0),
+    default=DEFAULT_CACHE_SIZE_MB,
+    help=f"Response cache size limit in MB, 0 for no limit (default: {DEFAULT_CACHE_SIZE_MB})",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Measure wall/CPU time and peak memory of each snippet",
+)
+@click.option(
+    "--profile-top",
+    type=click.IntRange(min=0),
+    default=0,
+    help="Also list the N functions with the most own time (cProfile), implies --profile",
+)
+@click.option(
+    "--debug",
+    is_flag=True,
+    help="Enable debug output (TUI: shown in a panel toggled with F12)",
+)
+@click.option(
+    "--debug-log",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Append debug output to a file instead of the screen, implies --debug",
+)
 @click.option("--show-code-results", is_flag=True, help="Show code execution results in TUI")
+@click.option(
+    "--max-rendered-lines",
+    type=click.IntRange(min=0),
+    default=DEFAULT_MAX_RENDERED_LINES,
+    help=f"Rendered lines kept in memory by the TUI, 0 for no limit "
+    f"(default: {DEFAULT_MAX_RENDERED_LINES})",
+)
 @click.option("--no-tui", is_flag=True, help="Use simple Rich CLI instead of TUI")
 @click.option("--no-code", is_flag=True, help="Hide generated code (Rich CLI only)")
 @click.option("--no-timestamp", is_flag=True, help="Disable timestamps (Rich CLI only)")
-def cli(
+def run(
     prompt: str | None,
     api_url: str,
     model: str,
+    backend: str,
+    preload: str,
+    warm_workers: int,
+    turn_limits: str,
+    session_limits: str,
+    cache_mode: CacheMode,
+    cache_dir: Path,
+    cache_size: int,
+    profile: bool,
+    profile_top: int,
     debug: bool,
+    debug_log: Path | None,
     show_code_results: bool,
+    max_rendered_lines: int,
     no_tui: bool,
     no_code: bool,
     no_timestamp: bool,
@@ -89,10 +259,26 @@ def cli(
 
     If PROMPT is provided, runs that prompt and exits (uses Rich CLI mode).
     Otherwise, starts the interactive TUI (or Rich CLI with --no-tui).
+
+    This is the default command. See `caducode export --help` to convert
+    saved transcripts.
     """
-    # Validate model exists on the server
     try:
-        validate_model(api_url, model)
+        turn = parse_limits(turn_limits)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--turn-limits") from e
+    try:
+        session = parse_limits(session_limits)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--session-limits") from e
+    budget = Budget(turn, session)
+    cache = ResponseCache(cache_dir, cache_mode, cache_size * 1024 * 1024)
+    profile_options = ProfileOptions(top=profile_top) if profile or profile_top else None
+
+    # Validate model exists on the server (replay works offline)
+    try:
+        if cache_mode != "replay":
+            validate_model(api_url, model)
     except OllamaConnectionError as e:
         console.print(f"[bold red]Error:[/bold red] {e}")
         sys.exit(1)
@@ -114,12 +300,86 @@ def cli(
         and sys.stdout.isatty()
     )
 
-    if use_tui:
-        run_tui(api_url, model, debug=debug, show_code_results=show_code_results)
-    else:
-        printer = Printer(
-            show_timestamps=not no_timestamp,
-            show_code=not no_code,
-            debug=debug,
+    # Create the executor before any threads exist (the fork backend forks here)
+    try:
+        executor = create_executor(
+            backend,
+            preload=[name.strip() for name in preload.split(",") if name.strip()],
+            warm_workers=warm_workers,
         )
-        asyncio.run(main_repl(api_url, model, printer, prompt))
+    except BackendUnavailableError as e:
+        console.print(f"[bold red]Error:[/bold red] {e}")
+        sys.exit(1)
+
+    # Started after the executor, as its writer is a thread
+    sink: DebugLog | None = None
+    try:
+        if debug_log is not None:
+            try:
+                sink = DebugLog.to_file(debug_log)
+            except OSError as e:
+                console.print(f"[bold red]Error:[/bold red] Cannot open debug log: {e}")
+                sys.exit(1)
+        if use_tui:
+            run_tui(
+                api_url,
+                model,
+                executor,
+                budget,
+                cache,
+                debug=debug or sink is not None,
+                debug_log=sink,
+                show_code_results=show_code_results,
+                max_rendered_lines=max_rendered_lines or None,
+                profile=profile_options,
+            )
+        else:
+            if sink is None and debug:
+                sink = DebugLog.to_console(console)
+            printer = Printer(
+                show_timestamps=not no_timestamp,
+                show_code=not no_code,
+                debug_log=sink,
+            )
+            asyncio.run(
+                main_repl(api_url, model, printer, executor, budget, cache, profile_options, prompt)
+            )
+    finally:
+        if sink is not None:
+            sink.close()
+        executor.close()
+
+
+@cli.command()
+@click.argument("transcript", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Output file (default: TRANSCRIPT with the format's suffix)",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(EXPORT_FORMATS),
+    help="Output format (default: guessed from the output suffix, else markdown)",
+)
+def export(transcript: Path, output: Path | None, fmt: ExportFormat | None) -> None:
+    """Export a JSONL TRANSCRIPT saved from the TUI to Markdown, HTML or JSONL.
+
+    The transcript is streamed, so even very long sessions are converted in
+    bounded memory.
+    """
+    if output is None:
+        suffix = {"markdown": ".md", "html": ".html", "jsonl": ".jsonl"}[fmt or "markdown"]
+        output = transcript.with_suffix(suffix)
+    if fmt is None:
+        try:
+            fmt = format_for_path(output)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--output") from e
+    if output.resolve() == transcript.resolve():
+        raise click.BadParameter("Output must differ from the transcript", param_hint="--output")
+
+    export_transcript(read_jsonl(transcript), output, fmt)
+    console.print(f"Exported {transcript} to {output} ({fmt})")
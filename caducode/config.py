@@ -1,25 +1,57 @@
 """Configuration constants for CaduCode."""
 
+from pathlib import Path
+
+from pydantic_ai.models import Model
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.providers.ollama import OllamaProvider
 from pydantic_ai.settings import ModelSettings
 
+from .cache import CachedModel, ResponseCache
+from .tokens import AccountingModel, TokenAccounting
+
 DEFAULT_OLLAMA_URL = "http://cadumac:11434"
 DEFAULT_MODEL = "qwen3-coder:30b"
 MODEL_SETTINGS = ModelSettings(timeout=120)
+DEFAULT_BACKEND = "inprocess"
+BACKENDS = ("inprocess", "fork")
+DEFAULT_PRELOAD = ("json", "os", "pathlib", "re", "subprocess")
+DEFAULT_WARM_WORKERS = 1
+DEFAULT_MAX_RENDERED_LINES = 5000
+DEBUG_PANEL_LINES = 2000
+TRANSCRIPT_NAME_FORMAT = "caducode-%Y%m%d-%H%M%S.jsonl"
+DEFAULT_TURN_LIMITS = "requests=50,tool_calls=40,seconds=600"
+DEFAULT_SESSION_LIMITS = ""
+DEFAULT_CACHE_MODE = "passthrough"
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "caducode" / "responses"
+DEFAULT_CACHE_SIZE_MB = 200
 
 
-def create_ollama_model(base_url: str, model_name: str) -> OpenAIChatModel:
+def create_ollama_model(
+    base_url: str,
+    model_name: str,
+    cache: ResponseCache | None = None,
+    accounting: TokenAccounting | None = None,
+) -> Model:
     """Create an Ollama-based OpenAI chat model.
 
     Args:
         base_url: Ollama API base URL.
         model_name: Name of the model to use.
+        cache: Response cache to answer identical requests from, if any.
+        accounting: Token accounting recording every request not served from the cache, if any.
 
     Returns:
-        Configured OpenAIChatModel.
+        Configured OpenAIChatModel, wrapped in an AccountingModel when accounting
+        is given and in a CachedModel when a cache is given.
     """
-    return OpenAIChatModel(
+    model: Model = OpenAIChatModel(
         model_name=model_name,
         provider=OllamaProvider(base_url=f"{base_url}/v1"),
     )
+    # Inside the cache, so cache hits are not counted as tokens spent
+    if accounting is not None:
+        model = AccountingModel(model, accounting)
+    if cache is not None and cache.enabled:
+        model = CachedModel(model, cache)
+    return model
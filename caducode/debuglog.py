@@ -0,0 +1,203 @@
+"""Non-blocking debug log: records are queued and formatted by a background writer."""
+
+from __future__ import annotations
+
+import reprlib
+import threading
+import time
+import traceback
+from collections import deque
+from collections.abc import Callable
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+# Records queued before the oldest ones are dropped
+DEBUG_BUFFER_RECORDS = 10_000
+# Characters of a formatted message kept, the rest is cut
+DEBUG_MAX_CHARS = 2000
+# Seconds close() waits for the writer to drain the buffer
+CLOSE_TIMEOUT = 2.0
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 4
+_repr.maxstring = DEBUG_MAX_CHARS
+_repr.maxother = DEBUG_MAX_CHARS
+_repr.maxlist = _repr.maxtuple = _repr.maxset = _repr.maxdict = 100
+
+
+def snapshot(message: object) -> object:
+    """Copy the part of a mutable message that format_message() shows, in bounded time.
+
+    Lists are cut to the items repr() shows, small dicts and sets are copied;
+    larger ones and the items inside containers are formatted as they are when
+    the writer gets to them, which may be after the snippet changed them.
+    """
+    if isinstance(message, list):
+        return message[: _repr.maxlist + 1]
+    if isinstance(message, dict) and len(message) <= _repr.maxdict:
+        return dict(message)
+    if isinstance(message, set) and len(message) <= _repr.maxset:
+        return set(message)
+    return message
+
+
+def format_message(message: object, max_chars: int = DEBUG_MAX_CHARS) -> str:
+    """Format a debug message, cut to max_chars.
+
+    Strings are kept as they are, exceptions are formatted as tracebacks and
+    other values with a size-bounded repr(), so a huge value costs no more
+    than its first max_chars characters.
+    """
+    try:
+        if isinstance(message, str):
+            text = message
+        elif isinstance(message, BaseException):
+            text = "".join(traceback.format_exception(message)).rstrip("\n")
+        else:
+            text = _repr.repr(message)
+    except Exception as e:
+        # The value may be changed by the snippet while it is formatted
+        text = f"<{type(message).__name__} could not be formatted: {e!r}>"
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+    return text
+
+
+@dataclass
+class DebugRecord:
+    """A debug message waiting to be formatted."""
+
+    time: float
+    label: str
+    message: object
+
+    def format(self, max_chars: int) -> str:
+        """Format as "HH:MM:SS.mmm [DEBUG label] message"."""
+        stamp = time.strftime("%H:%M:%S", time.localtime(self.time))
+        millis = int(self.time % 1 * 1000)
+        message = format_message(self.message, max_chars)
+        return f"{stamp}.{millis:03d} [DEBUG {self.label}] {message}"
+
+
+class DebugLog:
+    """Debug sink handing records to a background writer thread.
+
+    emit() only appends to a bounded ring buffer, so it costs the same whatever
+    the message size; formatting and writing happen on the writer thread. When
+    the writer falls behind, the oldest records are dropped and the number of
+    dropped records is written instead.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[str]], None],
+        *,
+        capacity: int = DEBUG_BUFFER_RECORDS,
+        max_chars: int = DEBUG_MAX_CHARS,
+        on_close: Callable[[], None] | None = None,
+    ) -> None:
+        """Start the writer.
+
+        Args:
+            write: Called on the writer thread with a batch of formatted records.
+            capacity: Records buffered before the oldest are dropped.
+            max_chars: Characters kept of each formatted message.
+            on_close: Called once the writer has stopped, e.g. to close a file.
+        """
+        self._write = write
+        self.max_chars = max_chars
+        self._on_close = on_close
+        self._records: deque[DebugRecord] = deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        self._dropped = 0
+        self._emitted = 0
+        self._done = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="debug-log", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def to_file(cls, path: Path) -> DebugLog:
+        """Create a debug log appending to a file.
+
+        Raises:
+            OSError: If the file cannot be opened.
+        """
+        fp = path.open("a", encoding="utf-8")
+
+        def write(lines: list[str]) -> None:
+            fp.write("".join(f"{line}\n" for line in lines))
+            fp.flush()
+
+        return cls(write, on_close=fp.close)
+
+    @classmethod
+    def to_console(cls, console: Console) -> DebugLog:
+        """Create a debug log printing to a Rich console.
+
+        The console must write to an explicit file, like the printer module's: it is
+        used from the writer thread while snippets have sys.stdout redirected.
+        """
+
+        def write(lines: list[str]) -> None:
+            for line in lines:
+                console.print(line, style="dim cyan", markup=False, highlight=False)
+
+        return cls(write)
+
+    def emit(self, label: str, message: object) -> None:
+        """Queue a record; message is formatted later, see snapshot() and format_message()."""
+        record = DebugRecord(time.time(), label, snapshot(message))
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._records) == self._records.maxlen:
+                self._dropped += 1
+            self._records.append(record)
+            self._emitted += 1
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._records or self._closed)
+                records = list(self._records)
+                self._records.clear()
+                dropped, self._dropped = self._dropped, 0
+                closed = self._closed
+            lines = [record.format(self.max_chars) for record in records]
+            if dropped:
+                lines.insert(0, f"[DEBUG] {dropped} records dropped, the writer fell behind")
+            if lines:
+                # Debug output must never break the session
+                with suppress(Exception):
+                    self._write(lines)
+            with self._condition:
+                self._done += len(records) + dropped
+                self._condition.notify_all()
+            if closed and not records:
+                break
+        if self._on_close is not None:
+            self._on_close()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every record emitted so far is written.
+
+        Returns:
+            Whether everything was written before the timeout.
+        """
+        with self._condition:
+            target = self._emitted
+            return self._condition.wait_for(lambda: self._done >= target, timeout)
+
+    def close(self) -> None:
+        """Write the remaining records and stop the writer."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(CLOSE_TIMEOUT)
@@ -1,5 +1,9 @@
 """Custom exceptions for CaduCode."""
 
+from __future__ import annotations
+
+from pathlib import Path
+
 
 class CaduCodeError(Exception):
     """Base exception for CaduCode."""
@@ -24,3 +28,52 @@ class OllamaConnectionError(CaduCodeError):
         if cause:
             msg += f": {cause}"
         super().__init__(msg)
+
+
+class ExecutionCancelledError(CaduCodeError):
+    """Raised inside a running snippet when the user cancels it."""
+
+
+class BackendUnavailableError(CaduCodeError):
+    """Raised when an execution backend is not supported on this platform."""
+
+    def __init__(self, backend: str, reason: str) -> None:
+        self.backend = backend
+        self.reason = reason
+        super().__init__(f"Execution backend '{backend}' is unavailable: {reason}")
+
+
+class RepeatedFailureError(CaduCodeError):
+    """Raised to stop a turn after the same run_python error kept repeating."""
+
+    def __init__(self, signature: str, count: int) -> None:
+        self.signature = signature
+        self.count = count
+        super().__init__(
+            f"Stopped after the same error occurred {count} times in a row: {signature}"
+        )
+
+
+class BudgetExhaustedError(CaduCodeError):
+    """Raised when a new turn is started after the session budget was used up."""
+
+    def __init__(self, reason: str) -> None:
+        self.reason = reason
+        super().__init__(f"Session budget exhausted: {reason}")
+
+
+class CacheMissError(CaduCodeError):
+    """Raised in replay mode when a model request is not in the response cache."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        super().__init__(f"Model request not found in the response cache (replay mode): {key[:12]}")
+
+
+class PatchError(CaduCodeError):
+    """Raised by _patch() and _apply_diff() when an edit can't be applied."""
+
+    def __init__(self, path: Path | None, reason: str) -> None:
+        self.path = path
+        self.reason = reason
+        super().__init__(f"{path}: {reason}" if path is not None else reason)
@@ -2,42 +2,409 @@
 
 from __future__ import annotations
 
-import traceback
-from typing import Any
+import contextlib
+import ctypes
+import importlib
+import io
+import threading
+import time
+from collections.abc import Callable, Sequence
+from typing import Any, Protocol
 
+from .exceptions import ExecutionCancelledError
+from .failures import compact_traceback
+from .filepager import FILE_HELPERS
+from .patching import apply_diff, patch_file
 from .printer import Printer
+from .profiling import PROFILE_PREFIX, ProfileOptions, Profiler, profile_call
+from .snippets import analyze_snippet
 
 # Persistent execution environment for run_python
 exec_globals: dict[str, Any] = {}
 exec_locals: dict[str, Any] = {}
 
+# Minimum seconds between two flushes of streamed output to the UI
+OUTPUT_FLUSH_INTERVAL = 0.1
+# Maximum characters of a single _return() value echoed to the output stream
+RETURN_PREVIEW_CHARS = 200
 
-def execute_python(code: str, printer: Printer) -> list[Any]:
+SYNTAX_ERROR_PREFIX = "Exception raised (code was not run):\n"
+UNDEFINED_NAMES_PREFIX = "Names not defined in the environment: "
+WHAT_IF_UNSUPPORTED = "what_if=True requires the fork execution backend (--backend fork)"
+
+
+class CancelToken:
+    """Handle used to cancel a snippet while it is running.
+
+    Cancellation is checked whenever the snippet writes output or calls _return().
+    Pure-Python code running in this process is additionally interrupted by raising
+    ExecutionCancelledError asynchronously in the executing thread; blocking C calls
+    (e.g. waiting on a subprocess) are only interrupted once they return. Backends
+    running snippets elsewhere poll `cancelled` and interrupt them themselves.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread_id: int | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancellation has been requested."""
+        return self._event.is_set()
+
+    @property
+    def running(self) -> bool:
+        """Whether a snippet is running with this token."""
+        return self._running
+
+    def cancel(self) -> None:
+        """Request cancellation of the running snippet."""
+        self._event.set()
+        with self._lock:
+            if self._thread_id is not None:
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                    ctypes.c_ulong(self._thread_id),
+                    ctypes.py_object(ExecutionCancelledError),
+                )
+
+    def reset(self) -> None:
+        """Clear a previous cancellation so the token can be used again."""
+        self._event.clear()
+
+    def check(self) -> None:
+        """Raise ExecutionCancelledError if cancellation was requested."""
+        if self._event.is_set():
+            raise ExecutionCancelledError
+
+    def _attach(self, interrupt: bool = True) -> None:
+        """Mark a snippet as running; with interrupt, cancel() raises in this thread."""
+        with self._lock:
+            self._running = True
+            self._thread_id = threading.get_ident() if interrupt else None
+
+    def _detach(self) -> None:
+        with self._lock:
+            self._running = False
+            self._thread_id = None
+
+
+class OutputStream(io.TextIOBase):
+    """Text stream forwarding writes to a callback at a limited rate.
+
+    Writes arriving within min_interval of the last flush are buffered and
+    flushed by a timer, so output followed by a long quiet step still shows.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[str], None],
+        cancel: CancelToken | None = None,
+        min_interval: float = OUTPUT_FLUSH_INTERVAL,
+    ) -> None:
+        super().__init__()
+        self._callback = callback
+        self._cancel = cancel
+        self._min_interval = min_interval
+        self._buffer: list[str] = []
+        self._last_flush = 0.0
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+        # Held while a chunk is delivered, so chunks arrive in order
+        self._flush_lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if self._cancel is not None:
+            self._cancel.check()
+        if s:
+            with self._lock:
+                self._buffer.append(s)
+                wait = self._last_flush + self._min_interval - time.monotonic()
+                if wait > 0 and self._timer is None:
+                    self._timer = threading.Timer(wait, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+            if wait <= 0:
+                self.flush()
+        return len(s)
+
+    def flush(self) -> None:
+        """Deliver the buffered output and cancel the pending timed flush."""
+        with self._flush_lock:
+            with self._lock:
+                chunk = "".join(self._buffer)
+                self._buffer.clear()
+                self._last_flush = time.monotonic()
+                timer, self._timer = self._timer, None
+            if timer is not None:
+                timer.cancel()
+            if chunk:
+                self._callback(chunk)
+
+
+def execute_python(
+    code: str,
+    printer: Printer,
+    *,
+    on_output: Callable[[str], None] | None = None,
+    cancel: CancelToken | None = None,
+    profile: ProfileOptions | None = None,
+) -> list[Any]:
     """Execute Python code in the persistent environment.
 
     Args:
         code: Python code to execute.
         printer: Printer instance for output.
+        on_output: Callback receiving stdout/stderr and _return() previews while the
+            snippet runs. Output is discarded when not given.
+        cancel: Token that can be used to cancel the snippet while it runs.
+        profile: Measure the snippet and append its profile (see PROFILE_PREFIX)
+            to the result.
 
     Returns:
         List of values passed to _return(), or error traceback if exception raised.
     """
+    info = analyze_snippet(code)
+    printer.debug_msg("SNIPPET", info.summary())
+    if info.code is None:
+        return [f"{SYNTAX_ERROR_PREFIX}{info.syntax_error}"]
+
     results: list[Any] = []
+    stream = OutputStream(on_output, cancel) if on_output is not None else None
 
     def _return(data: Any) -> None:
         """Return data to the LLM. Accumulates into results list."""
-        printer.debug_msg("_return", repr(data))
+        if cancel is not None:
+            cancel.check()
+        printer.debug_msg("_return", data)
         results.append(data)
+        if stream is not None:
+            preview = repr(data)
+            if len(preview) > RETURN_PREVIEW_CHARS:
+                preview = preview[:RETURN_PREVIEW_CHARS] + "..."
+            stream.write(f"→ {preview}\n")
+
+    def _profile(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call fn(*args, **kwargs), _return() its profile and return its value."""
+        value, report = profile_call(fn, args, kwargs)
+        name = getattr(fn, "__qualname__", repr(fn))
+        _return(f"_profile({name}): {report.format()}")
+        return value
+
+    def _patch(path: str, old: str, new: str, count: int = 1) -> None:
+        """Replace old with new in a file and _return() a one-line report."""
+        _return(patch_file(path, old, new, count))
 
-    # Inject built-in function into execution scope
+    def _apply_diff(diff: str, root: str | None = None) -> None:
+        """Apply a unified diff and _return() a report per file."""
+        _return(apply_diff(diff, root))
+
+    # Inject built-in functions into execution scope
     exec_globals["_return"] = _return
+    exec_globals["_profile"] = _profile
+    exec_globals["_patch"] = _patch
+    exec_globals["_apply_diff"] = _apply_diff
+    exec_globals.update(FILE_HELPERS)
+
+    # Flagged before running, as a warning: the snippet may still define them dynamically
+    undefined = info.undefined_names(exec_globals, exec_locals)
+    if undefined:
+        printer.debug_msg("SNIPPET", f"{UNDEFINED_NAMES_PREFIX}{', '.join(undefined)}")
+
+    profiler = Profiler(profile) if profile is not None else None
+    with contextlib.ExitStack() as stack:
+        if stream is not None:
+            stack.enter_context(contextlib.redirect_stdout(stream))
+            stack.enter_context(contextlib.redirect_stderr(stream))
+            stack.callback(stream.flush)
+        try:
+            if cancel is not None:
+                cancel.check()
+                cancel._attach()
+            try:
+                if undefined and stream is not None:
+                    stream.write(f"⚠ {UNDEFINED_NAMES_PREFIX}{', '.join(undefined)}\n")
+                with profiler if profiler is not None else contextlib.nullcontext():
+                    exec(info.code, exec_globals, exec_locals)  # noqa: S102
+            finally:
+                if cancel is not None:
+                    cancel._detach()
+            result = results if results else ["Code block didn't _return() any data"]
+            printer.debug_msg("TOOL RESULT", result)
+        except ExecutionCancelledError:
+            printer.debug_msg("TOOL CANCELLED", list(results))
+            result = [*results, "Execution cancelled by user"]
+        except Exception as e:
+            printer.debug_msg("TOOL ERROR", e)
+            hint = None
+            if isinstance(e, NameError):
+                undefined = info.undefined_names(exec_globals, exec_locals)
+                if undefined:
+                    hint = f"{UNDEFINED_NAMES_PREFIX}{', '.join(undefined)}"
+            result = [compact_traceback(e, hint)]
+
+    if profiler is not None:
+        printer.debug_msg("PROFILE", profiler.report.format())
+        result = [*result, f"{PROFILE_PREFIX}{profiler.report.format()}"]
+    return result
+
+
+def preload_modules(modules: Sequence[str], namespace: dict[str, Any]) -> list[str]:
+    """Import modules and bind them in a namespace.
+
+    Args:
+        modules: Module names to import (dotted names are bound by their first part,
+            like a plain import statement).
+        namespace: Namespace receiving the imported modules.
+
+    Returns:
+        Names of the modules that could not be imported.
+    """
+    failed: list[str] = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            failed.append(name)
+            continue
+        top = name.partition(".")[0]
+        namespace[top] = importlib.import_module(top)
+    return failed
+
+
+class Executor(Protocol):
+    """Backend running run_python snippets."""
+
+    supports_what_if: bool
+
+    def execute(
+        self,
+        code: str,
+        printer: Printer,
+        *,
+        on_output: Callable[[str], None] | None = None,
+        cancel: CancelToken | None = None,
+        what_if: bool = False,
+        profile: ProfileOptions | None = None,
+    ) -> list[Any]:
+        """Execute a snippet, see execute_python() for the arguments."""
+        ...
+
+    def reset(self) -> None:
+        """Start over with a fresh namespace."""
+        ...
+
+    def describe(self) -> str:
+        """One-line status of the backend, shown to the user."""
+        ...
+
+    def close(self) -> None:
+        """Release resources held by the backend."""
+        ...
+
+
+class InProcessExecutor:
+    """Executor running snippets in this process, in the module-level namespace.
+
+    Preloaded modules are imported in a background thread so startup isn't delayed;
+    the first snippet waits for them. A reset requested while a snippet runs waits
+    for it to finish.
+    """
+
+    supports_what_if = False
+
+    def __init__(self, preload: Sequence[str] = ()) -> None:
+        self.preload = tuple(preload)
+        self._failed: list[str] = []
+        self._lock = threading.Lock()
+        self._preloader = threading.Thread(target=self._preload, daemon=True)
+        self._preloader.start()
+
+    def _preload(self) -> None:
+        self._failed = preload_modules(self.preload, exec_globals)
+
+    def execute(
+        self,
+        code: str,
+        printer: Printer,
+        *,
+        on_output: Callable[[str], None] | None = None,
+        cancel: CancelToken | None = None,
+        what_if: bool = False,
+        profile: ProfileOptions | None = None,
+    ) -> list[Any]:
+        """Execute a snippet with execute_python()."""
+        if what_if:
+            return [WHAT_IF_UNSUPPORTED]
+        self._preloader.join()
+        with self._lock:
+            return execute_python(
+                code,
+                printer,
+                on_output=on_output,
+                cancel=cancel,
+                profile=profile,
+            )
+
+    def reset(self) -> None:
+        """Clear the namespace and bind the preloaded modules again.
+
+        Waits for the running snippet, if any, instead of clearing its namespace
+        under it.
+        """
+        self._preloader.join()
+        with self._lock:
+            exec_globals.clear()
+            exec_locals.clear()
+            self._preload()
+
+    def describe(self) -> str:
+        """One-line status of the backend."""
+        if self._preloader.is_alive():
+            return f"Backend: in-process, preloading: {', '.join(self.preload)}"
+        return f"Backend: in-process{describe_preload(self.preload, self._failed)}"
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+
+def describe_preload(preload: Sequence[str], failed: Sequence[str]) -> str:
+    """Format the preload part of an executor description."""
+    loaded = [name for name in preload if name not in failed]
+    text = f", preloaded: {', '.join(loaded) or 'none'}"
+    if failed:
+        text += f" (failed: {', '.join(failed)})"
+    return text
+
+
+def create_executor(
+    backend: str,
+    *,
+    preload: Sequence[str] = (),
+    warm_workers: int = 1,
+) -> Executor:
+    """Create the execution backend with the given name.
+
+    Args:
+        backend: "inprocess" or "fork".
+        preload: Modules imported into the namespace before the first snippet.
+        warm_workers: Number of pre-forked workers kept ready (fork backend only).
+
+    Returns:
+        Executor instance.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+        BackendUnavailableError: If the backend is not supported on this platform.
+    """
+    if backend == "inprocess":
+        return InProcessExecutor(preload)
+    if backend == "fork":
+        from .forking import ForkExecutor
 
-    try:
-        exec(code, exec_globals, exec_locals)  # noqa: S102
-        result = results if results else ["Code block didn't _return() any data"]
-        printer.debug_msg("TOOL RESULT", repr(result))
-        return result
-    except Exception:
-        tb = traceback.format_exc()
-        printer.debug_msg("TOOL ERROR", tb)
-        return [f"Exception raised:\n{tb}"]
+        return ForkExecutor(preload, warm_workers=warm_workers)
+    raise ValueError(f"Unknown execution backend: {backend}")
@@ -0,0 +1,134 @@
+"""Compact error reports and detection of repeated run_python failures."""
+
+from __future__ import annotations
+
+import re
+import threading
+import traceback
+from pathlib import Path
+from typing import Any
+
+from .exceptions import RepeatedFailureError
+from .profiling import split_profile
+from .snippets import SNIPPET_FILENAME_PREFIX
+
+# Start of every run_python result reporting an error
+EXCEPTION_PREFIX = "Exception raised"
+# Consecutive equivalent failures in a turn before the model is told to change approach
+MAX_REPEATED_FAILURES = 3
+# Further equivalent failures tolerated after that before the turn is stopped
+EXTRA_FAILURES_BEFORE_STOP = 2
+
+STEER_MESSAGE = (
+    "This approach has now failed {count} times in a row with the same error. "
+    "Do NOT retry it: try a different approach, or explain the problem to the user."
+)
+
+_ADDRESS = re.compile(r"0x[0-9a-fA-F]+")
+
+
+def compact_traceback(exc: BaseException, hint: str | None = None) -> str:
+    """Format an exception raised by a snippet, keeping only the snippet's frames.
+
+    The frame where the exception was raised is kept as well when it is outside
+    the snippet (e.g. in a library function). The exception line is always last.
+
+    Args:
+        exc: The exception.
+        hint: Optional line shown before the traceback.
+
+    Returns:
+        Compact error report.
+    """
+    frames = traceback.extract_tb(exc.__traceback__)
+    lines = [f"{EXCEPTION_PREFIX}:"]
+    if hint:
+        lines.append(hint)
+    lines.append("Traceback (snippet frames only):")
+    for frame in frames:
+        if frame.filename.startswith(SNIPPET_FILENAME_PREFIX):
+            lines.append(f"  line {frame.lineno}, in {frame.name}: {(frame.line or '').strip()}")
+    if frames and not frames[-1].filename.startswith(SNIPPET_FILENAME_PREFIX):
+        last = frames[-1]
+        location = "/".join(Path(last.filename).parts[-2:])
+        lines.append(f"  raised in {location}:{last.lineno}, in {last.name}")
+    lines.extend(line.rstrip("\n") for line in traceback.format_exception_only(exc))
+    return "\n".join(lines) + "\n"
+
+
+def failure_signature(result: list[Any]) -> str | None:
+    """Return the normalized exception line of a failed run_python result, else None."""
+    result, _ = split_profile(result)
+    if len(result) != 1 or not isinstance(result[0], str):
+        return None
+    if not result[0].startswith(EXCEPTION_PREFIX):
+        return None
+    lines = [line for line in result[0].splitlines() if line.strip()]
+    return _ADDRESS.sub("0x…", lines[-1].strip())
+
+
+class FailureTracker:
+    """Deduplicate repeated errors within a turn and stop runaway retry loops.
+
+    Turns are told apart by the PydanticAI run id, so the tracker resets itself
+    when a new run starts.
+    """
+
+    def __init__(
+        self,
+        max_repeated: int = MAX_REPEATED_FAILURES,
+        extra_before_stop: int = EXTRA_FAILURES_BEFORE_STOP,
+    ) -> None:
+        self.max_repeated = max_repeated
+        self.extra_before_stop = extra_before_stop
+        self._lock = threading.Lock()
+        self._run_id: str | None = None
+        self._calls = 0
+        self._first_call: dict[str, int] = {}
+        self._last_signature: str | None = None
+        self._streak = 0
+
+    def check(self, run_id: str | None, result: list[Any]) -> list[Any]:
+        """Process a run_python result before it is sent to the model.
+
+        Args:
+            run_id: Id of the run the call belongs to.
+            result: Result of the call.
+
+        Returns:
+            The result, shortened if the same error was already reported in this
+            turn, with a warning appended when the error keeps repeating.
+
+        Raises:
+            RepeatedFailureError: If the model kept repeating the failure after
+                being warned; run_turn() ends the turn on it, keeping its history.
+        """
+        with self._lock:
+            if run_id != self._run_id:
+                self._run_id = run_id
+                self._calls = 0
+                self._first_call.clear()
+                self._last_signature = None
+                self._streak = 0
+            self._calls += 1
+
+            signature = failure_signature(result)
+            if signature is None:
+                self._last_signature = None
+                self._streak = 0
+                return result
+
+            self._streak = self._streak + 1 if signature == self._last_signature else 1
+            self._last_signature = signature
+            first = self._first_call.setdefault(signature, self._calls)
+
+            if self._streak >= self.max_repeated + self.extra_before_stop:
+                raise RepeatedFailureError(signature, self._streak)
+            if first != self._calls:
+                result = [
+                    f"{EXCEPTION_PREFIX}:\nSame error as run_python call #{first} "
+                    f"of this turn:\n{signature}"
+                ]
+            if self._streak >= self.max_repeated:
+                result = [*result, STEER_MESSAGE.format(count=self._streak)]
+            return result
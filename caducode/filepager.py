@@ -0,0 +1,212 @@
+"""Paged access to large files through mmap, injected into the exec namespace.
+
+_lines(), _tail() and _search() let the model page through multi-GB files
+without reading them whole or re-scanning them with sed/tail on every call.
+"""
+
+from __future__ import annotations
+
+import bisect
+import errno
+import mmap
+import os
+import re
+import stat as stat_module
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+# Bytes per chunk of the line index: one newline count is kept per chunk
+INDEX_CHUNK = 1 << 16
+# Files kept open and indexed at the same time
+MAX_OPEN_FILES = 16
+# Matches returned by _search() unless another limit is given
+DEFAULT_SEARCH_LIMIT = 100
+
+
+class PagedFile:
+    """Memory-mapped file with a sparse line index.
+
+    The index holds the number of newlines up to the end of each INDEX_CHUNK
+    bytes, counted once at C speed. Locating a line then only scans the chunk
+    it falls in, so reading a slice costs time proportional to the slice.
+
+    Files reporting a size of 0, like those in /proc and /sys, are read whole
+    instead: their contents are generated when read.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Map or read a regular file.
+
+        Raises:
+            OSError: If the file cannot be opened or isn't a regular file
+                (e.g. a FIFO or a device, which can't be paged through).
+        """
+        self.path = path
+        if not stat_module.S_ISREG(path.stat().st_mode):
+            raise OSError(errno.EINVAL, "Not a regular file, read it with open()", str(path))
+        self._contents = b""
+        with path.open("rb") as fp:
+            stat = os.fstat(fp.fileno())
+            self.key = (stat.st_size, stat.st_mtime_ns)
+            self._map = (
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else None
+            )
+            if self._map is None:
+                self._contents = fp.read()
+        self.size = len(self._map) if self._map is not None else len(self._contents)
+        self._newlines_through: array[int] | None = None
+
+    def close(self) -> None:
+        """Unmap the file."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @property
+    def data(self) -> mmap.mmap | bytes:
+        """The file contents."""
+        return self._map if self._map is not None else self._contents
+
+    def _index(self) -> array[int]:
+        """Newlines counted through the end of each chunk, built on first use."""
+        if self._newlines_through is None:
+            counts = array("Q")
+            total = 0
+            for start in range(0, self.size, INDEX_CHUNK):
+                total += self.data[start : start + INDEX_CHUNK].count(b"\n")
+                counts.append(total)
+            self._newlines_through = counts
+        return self._newlines_through
+
+    def line_number(self, offset: int) -> int:
+        """1-based number of the line containing a byte offset."""
+        chunk = offset // INDEX_CHUNK
+        before = self._index()[chunk - 1] if chunk else 0
+        return before + self.data[chunk * INDEX_CHUNK : offset].count(b"\n") + 1
+
+    def line_start(self, line: int) -> int:
+        """Byte offset where a 1-based line starts (the file size past the end)."""
+        wanted = line - 1  # Newlines before the line
+        if wanted <= 0:
+            return 0
+        index = self._index()
+        chunk = bisect.bisect_left(index, wanted)
+        if chunk == len(index):
+            return self.size
+        seen = index[chunk - 1] if chunk else 0
+        pos = chunk * INDEX_CHUNK
+        data = self.data
+        while True:
+            pos = data.find(b"\n", pos) + 1
+            seen += 1
+            if seen == wanted:
+                return pos
+
+    def lines(self, start: int, end: int) -> str:
+        """Text of lines start..end (1-based, inclusive)."""
+        first = self.line_start(max(start, 1))
+        last = self.line_start(end + 1) if end >= start else first
+        return _decode(self.data[first:last])
+
+    def tail(self, count: int) -> str:
+        """Text of the last `count` lines."""
+        data = self.data
+        end = self.size
+        pos = end - 1 if data[end - 1 : end] == b"\n" else end
+        for _ in range(count):
+            pos = data.rfind(b"\n", 0, pos)
+            if pos < 0:
+                break
+        return _decode(data[pos + 1 : end])
+
+    def search(self, pattern: str, limit: int) -> list[tuple[int, str]]:
+        """First `limit` lines matching a regex, as (line number, line) pairs.
+
+        Like grep, each line is matched on its own: ^ and $ match at line
+        boundaries, and a match running into the next line (e.g. \\s matching
+        the newline) doesn't count.
+        """
+        regex = re.compile(pattern.encode(), re.MULTILINE)
+        data = self.data
+        matches: list[tuple[int, str]] = []
+        pos = 0
+        while len(matches) < limit and pos <= self.size:
+            found = regex.search(data, pos)
+            if found is None:
+                break
+            start = found.start()
+            if start == self.size and (start == 0 or data[start - 1 : start] == b"\n"):
+                # Empty match after the final newline, not a line of the file
+                break
+            line_start = data.rfind(b"\n", 0, start) + 1
+            line_end = data.find(b"\n", start)
+            if line_end < 0:
+                line_end = self.size
+            # The whole-file search is fast; a line is only searched alone when
+            # the match crossed its end
+            if found.end() <= line_end or regex.search(data, line_start, line_end):
+                matches.append((self.line_number(line_start), _decode(data[line_start:line_end])))
+            pos = line_end + 1
+        return matches
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+_open_files: OrderedDict[Path, PagedFile] = OrderedDict()
+_lock = threading.Lock()
+
+
+def paged_file(path: str | os.PathLike[str]) -> PagedFile:
+    """Return the PagedFile for a path, re-mapping it if its size or mtime changed.
+
+    Files reporting a size of 0 are read again on every call, as their
+    contents can change without their size or mtime changing.
+
+    Raises:
+        OSError: If the file cannot be opened or isn't a regular file.
+    """
+    resolved = Path(path).expanduser().resolve()
+    stat = resolved.stat()
+    if not stat.st_size:
+        return PagedFile(resolved)
+    with _lock:
+        cached = _open_files.get(resolved)
+        if cached is not None and cached.key == (stat.st_size, stat.st_mtime_ns):
+            _open_files.move_to_end(resolved)
+            return cached
+        if cached is not None:
+            cached.close()
+        paged = PagedFile(resolved)
+        _open_files[resolved] = paged
+        while len(_open_files) > MAX_OPEN_FILES:
+            _, evicted = _open_files.popitem(last=False)
+            evicted.close()
+        return paged
+
+
+def _lines(path: str | os.PathLike[str], start: int, end: int) -> str:
+    """Return lines start..end (1-based, inclusive) of a file, like sed -n 'start,endp'."""
+    return paged_file(path).lines(start, end)
+
+
+def _tail(path: str | os.PathLike[str], n: int = 10) -> str:
+    """Return the last n lines of a file."""
+    return paged_file(path).tail(n)
+
+
+def _search(
+    path: str | os.PathLike[str],
+    regex: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+) -> list[tuple[int, str]]:
+    """Return up to limit (line number, line) pairs of lines matching regex, like grep -n."""
+    return paged_file(path).search(regex, limit)
+
+
+# Helpers injected into the run_python namespace
+FILE_HELPERS: dict[str, Any] = {"_lines": _lines, "_tail": _tail, "_search": _search}
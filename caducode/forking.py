@@ -0,0 +1,452 @@
+"""Fork-based execution backend with copy-on-write what-if branches."""
+
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import signal
+import socket
+import threading
+from collections import deque
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from types import FrameType
+from typing import Any
+
+from . import execution
+from .debuglog import format_message
+from .exceptions import BackendUnavailableError, ExecutionCancelledError
+from .execution import (
+    SYNTAX_ERROR_PREFIX,
+    CancelToken,
+    describe_preload,
+    execute_python,
+    preload_modules,
+)
+from .printer import Printer
+from .profiling import PROFILE_PREFIX, ProfileOptions, split_profile
+from .snippets import analyze_snippet
+
+# Seconds between cancellation checks while waiting for a worker reply
+CANCEL_POLL_INTERVAL = 0.1
+
+WORKER_DIED = "Exception raised:\nExecution worker died unexpectedly"
+WORKER_REPLACED = (
+    f"{WORKER_DIED}, its namespace was lost. The next snippet runs in a fresh worker: "
+    "define variables and import modules again."
+)
+WHAT_IF_COMMITTED = "what_if: state committed"
+WHAT_IF_DISCARDED = "what_if: state discarded (call _commit() to keep it)"
+
+
+# Serializes messages to the driver: output is also sent by the stream's flush timer
+_send_lock = threading.Lock()
+# Whether the main thread is sending, and a cancel signal arrived meanwhile
+_main_sending = False
+_cancel_pending = False
+
+
+def _send(conn: Connection, message: tuple[Any, ...]) -> None:
+    """Send a message to the driver without being interrupted by a cancel signal."""
+    global _main_sending, _cancel_pending
+    main = threading.current_thread() is threading.main_thread()
+    previous = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT})
+    try:
+        with _send_lock:
+            _main_sending = main
+            try:
+                conn.send(message)
+            finally:
+                _main_sending = False
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, previous)
+    if main and _cancel_pending:
+        _cancel_pending = False
+        raise ExecutionCancelledError
+
+
+class _WorkerPrinter(Printer):
+    """Printer forwarding debug messages from the worker to the driver."""
+
+    def __init__(self, conn: Connection, debug: bool) -> None:
+        super().__init__(show_timestamps=False, show_code=False)
+        self.debug = debug
+        self._conn = conn
+
+    def debug_msg(self, label: str, message: object) -> None:
+        """Forward debug message to the driver (only if debug mode is enabled).
+
+        The message is formatted here, as values can't always be sent to the driver.
+        """
+        if self.debug:
+            _send(self._conn, ("debug", label, format_message(message)))
+
+
+def _picklable(values: list[Any]) -> list[Any]:
+    """Replace values that cannot be sent to the driver by their repr()."""
+    safe: list[Any] = []
+    for value in values:
+        try:
+            pickle.dumps(value)
+        except Exception:
+            value = repr(value)
+        safe.append(value)
+    return safe
+
+
+def _raise_cancelled(signum: int, frame: FrameType | None) -> None:
+    global _cancel_pending
+    del signum, frame
+    # Another thread may have caught the signal while the main thread was sending
+    if _main_sending:
+        _cancel_pending = True
+        return
+    raise ExecutionCancelledError
+
+
+@contextmanager
+def _cancellable() -> Iterator[None]:
+    """Turn SIGINT into ExecutionCancelledError while a snippet runs."""
+    signal.signal(signal.SIGINT, _raise_cancelled)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _no_commit() -> None:
+    """Keep the state of a what_if run (no-op outside what_if runs)."""
+
+
+def _run(
+    conn: Connection,
+    code: str,
+    debug: bool,
+    profile: ProfileOptions | None,
+) -> list[Any]:
+    """Run a snippet in this worker, streaming its output to the driver."""
+    printer = _WorkerPrinter(conn, debug)
+    _send(conn, ("started", os.getpid()))
+    try:
+        with _cancellable():
+            return execute_python(
+                code,
+                printer,
+                on_output=lambda text: _send(conn, ("output", text)),
+                profile=profile,
+            )
+    except ExecutionCancelledError:
+        return ["Execution cancelled by user"]
+
+
+def _run_what_if(
+    conn: Connection,
+    code: str,
+    debug: bool,
+    profile: ProfileOptions | None,
+) -> None:
+    """Run a snippet in a copy-on-write child of this worker.
+
+    If the snippet calls _commit() the child takes over as the worker and this
+    process exits. Otherwise the child exits and this process resumes serving.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        committed = False
+
+        def _commit() -> None:
+            """Keep the state of this what_if run."""
+            nonlocal committed
+            committed = True
+
+        execution.exec_globals["_commit"] = _commit
+        values, report = split_profile(_run(conn, code, debug, profile))
+        execution.exec_globals["_commit"] = _no_commit
+
+        os.write(write_fd, b"c" if committed else b"d")
+        os.close(write_fd)
+        note = WHAT_IF_COMMITTED if committed else WHAT_IF_DISCARDED
+        # The profile stays the last entry
+        extra = [f"{PROFILE_PREFIX}{report}"] if report is not None else []
+        _send(conn, ("result", _picklable([*values, note, *extra])))
+        if not committed:
+            os._exit(0)
+        return
+
+    os.close(write_fd)
+    status = os.read(read_fd, 1)
+    os.close(read_fd)
+    if status == b"c":
+        # The child now owns the session
+        os._exit(0)
+    os.waitpid(pid, 0)
+    if not status:
+        _send(conn, ("result", [WORKER_DIED]))
+
+
+def _serve(conn: Connection) -> None:
+    """Serve execution requests from the driver until closed."""
+    execution.exec_globals["_commit"] = _no_commit
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        if request[0] == "exec":
+            _, code, debug, what_if, profile = request
+            if what_if:
+                _run_what_if(conn, code, debug, profile)
+            else:
+                values = _run(conn, code, debug, profile)
+                _send(conn, ("result", _picklable(values)))
+        elif request[0] == "close":
+            return
+
+
+def _worker_main(sock: socket.socket) -> None:
+    """Entry point of a worker process forked by the zygote. Never returns."""
+    try:
+        # The zygote auto-reaps its children, workers wait for their what-if forks
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        _serve(Connection(sock.detach()))
+    finally:
+        os._exit(0)
+
+
+def _zygote_main(sock: socket.socket, preload: Sequence[str]) -> None:
+    """Entry point of the zygote process forking workers on request. Never returns."""
+    try:
+        # Own process group: terminal Ctrl+C must not reach the zygote or its workers
+        os.setpgrp()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+        namespace: dict[str, Any] = {}
+        failed = preload_modules(preload, namespace)
+        report = json.dumps(failed).encode()
+
+        while sock.recv(1):
+            worker_sock, driver_sock = socket.socketpair()
+            if os.fork() == 0:
+                sock.close()
+                driver_sock.close()
+                execution.exec_globals.update(namespace)
+                _worker_main(worker_sock)
+            worker_sock.close()
+            socket.send_fds(sock, [report], [driver_sock.fileno()])
+            driver_sock.close()
+    finally:
+        os._exit(0)
+
+
+@dataclass
+class PoolStats:
+    """Warm pool usage counters."""
+
+    hits: int = 0
+    misses: int = 0
+    failed_imports: list[str] = field(default_factory=list)
+
+
+class WarmPool:
+    """Pool of pre-forked workers with the preload modules already imported.
+
+    A zygote process is forked once, imports the preload list and then forks
+    workers on request. The pool keeps `size` idle workers ready so acquiring
+    one doesn't have to wait for the zygote.
+
+    Create it before the application starts any threads, since the zygote is
+    forked from the current process.
+    """
+
+    def __init__(self, preload: Sequence[str] = (), size: int = 1) -> None:
+        if not hasattr(os, "fork"):
+            raise BackendUnavailableError("fork", "os.fork() is not available on this platform")
+
+        self.preload = tuple(preload)
+        self.size = size
+        self.stats = PoolStats()
+        self._ready: deque[Connection] = deque()
+        self._lock = threading.Lock()
+
+        zygote_sock, self._sock = socket.socketpair()
+        self._pid = os.fork()
+        if self._pid == 0:
+            self._sock.close()
+            _zygote_main(zygote_sock, self.preload)
+        zygote_sock.close()
+
+        self._refill_async()
+
+    def _spawn(self) -> Connection:
+        """Ask the zygote for a new worker (caller holds the lock)."""
+        self._sock.sendall(b"s")
+        report, fds, _, _ = socket.recv_fds(self._sock, 4096, 1)
+        if not fds:
+            raise OSError("Zygote process died")
+        self.stats.failed_imports = json.loads(report)
+        return Connection(fds[0])
+
+    def _refill(self) -> None:
+        with self._lock:
+            try:
+                while len(self._ready) < self.size:
+                    self._ready.append(self._spawn())
+            except OSError:
+                pass
+
+    def _refill_async(self) -> None:
+        threading.Thread(target=self._refill, daemon=True).start()
+
+    def acquire(self) -> Connection:
+        """Take a ready worker from the pool, or fork one if none is ready.
+
+        Raises:
+            OSError: If the zygote process is gone.
+        """
+        with self._lock:
+            if self._ready:
+                self.stats.hits += 1
+                conn = self._ready.popleft()
+            else:
+                self.stats.misses += 1
+                conn = self._spawn()
+        self._refill_async()
+        return conn
+
+    def close(self) -> None:
+        """Stop idle workers and the zygote."""
+        with self._lock:
+            while self._ready:
+                self._ready.popleft().close()
+            self._sock.close()
+        with suppress(ChildProcessError):
+            os.waitpid(self._pid, 0)
+
+
+class ForkExecutor:
+    """Executor running snippets in a forked worker process holding the namespace.
+
+    Workers come from a WarmPool, so the preload modules are already imported.
+    Snippets run with what_if=True execute in a copy-on-write fork of the worker:
+    their state replaces the worker's only if they call _commit(), so checkpoints
+    of large namespaces cost next to nothing.
+
+    Create it before the application starts any threads, since the pool's zygote
+    is forked from the current process.
+    """
+
+    supports_what_if = True
+
+    def __init__(self, preload: Sequence[str] = (), *, warm_workers: int = 1) -> None:
+        self.pool = WarmPool(preload, warm_workers)
+        self._conn: Connection | None = None
+        self._lock = threading.Lock()
+
+    def _worker(self) -> Connection:
+        """Connection to the session worker, acquired on first use (caller holds the lock)."""
+        if self._conn is None:
+            self._conn = self.pool.acquire()
+        return self._conn
+
+    def execute(
+        self,
+        code: str,
+        printer: Printer,
+        *,
+        on_output: Callable[[str], None] | None = None,
+        cancel: CancelToken | None = None,
+        what_if: bool = False,
+        profile: ProfileOptions | None = None,
+    ) -> list[Any]:
+        """Execute a snippet in the worker, see execute_python() for the arguments."""
+        # Reject syntax errors without a round-trip to the worker
+        info = analyze_snippet(code)
+        if info.code is None:
+            printer.debug_msg("SNIPPET", info.summary())
+            return [f"{SYNTAX_ERROR_PREFIX}{info.syntax_error}"]
+
+        with self._lock:
+            # Running for the caller, but interrupted by _wait_result(), not in this thread
+            if cancel is not None:
+                cancel._attach(interrupt=False)
+            try:
+                conn = self._worker()
+                conn.send(("exec", code, printer.debug, what_if, profile))
+                return self._wait_result(conn, printer, on_output, cancel)
+            except (EOFError, OSError):
+                # Start over with a fresh worker rather than failing every later snippet
+                self._release()
+                return [WORKER_REPLACED]
+            finally:
+                if cancel is not None:
+                    cancel._detach()
+
+    def _wait_result(
+        self,
+        conn: Connection,
+        printer: Printer,
+        on_output: Callable[[str], None] | None,
+        cancel: CancelToken | None,
+    ) -> list[Any]:
+        """Relay worker messages until the snippet result arrives."""
+        active_pid: int | None = None
+        interrupted = False
+        while True:
+            if not conn.poll(CANCEL_POLL_INTERVAL):
+                if cancel is not None and cancel.cancelled and active_pid and not interrupted:
+                    os.kill(active_pid, signal.SIGINT)
+                    interrupted = True
+                continue
+
+            try:
+                kind, *payload = conn.recv()
+            except (EOFError, OSError):
+                raise
+            except Exception as e:
+                return [f"Exception raised:\nResult could not be transferred from worker: {e}"]
+
+            if kind == "started":
+                active_pid = payload[0]
+            elif kind == "output":
+                if on_output is not None:
+                    on_output(payload[0])
+            elif kind == "debug":
+                printer.debug_msg(payload[0], payload[1])
+            elif kind == "result":
+                result: list[Any] = payload[0]
+                return result
+
+    def _release(self) -> None:
+        """Stop the session worker (caller holds the lock)."""
+        if self._conn is None:
+            return
+        with suppress(OSError):
+            self._conn.send(("close",))
+        self._conn.close()
+        self._conn = None
+
+    def reset(self) -> None:
+        """Replace the session worker by a fresh one from the pool."""
+        with self._lock:
+            self._release()
+
+    def describe(self) -> str:
+        """One-line status of the backend, including warm pool stats."""
+        stats = self.pool.stats
+        return (
+            f"Backend: fork{describe_preload(self.pool.preload, stats.failed_imports)}, "
+            f"warm pool {self.pool.size}: {stats.hits} hits / {stats.misses} misses"
+        )
+
+    def close(self) -> None:
+        """Stop the session worker and the pool."""
+        with self._lock:
+            self._release()
+        self.pool.close()
@@ -0,0 +1,455 @@
+"""Targeted file edits for snippets: search/replace and unified diffs.
+
+_patch() and _apply_diff() let the model change a few lines of a file without
+writing the whole file back through run_python, which costs thousands of
+output tokens for a large file.
+"""
+
+from __future__ import annotations
+
+import difflib
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .exceptions import PatchError
+
+# Minimum similarity for a block to be reported as the closest match of missing text
+CLOSEST_MATCH_RATIO = 0.6
+# Lines of the closest match quoted in a failure report
+CLOSEST_MATCH_LINES = 6
+# Permissions of files created by a diff (mkstemp would leave them at 0o600)
+NEW_FILE_MODE = 0o644
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+@dataclass
+class TextFile:
+    """A text file split into lines, remembering its line ending.
+
+    Attributes:
+        path: Path of the file.
+        lines: Lines without their line endings.
+        newline: Line ending used by the file.
+        final_newline: Whether the last line ends with a line ending.
+        exists: Whether the file exists on disk.
+    """
+
+    path: Path
+    lines: list[str] = field(default_factory=list)
+    newline: str = "\n"
+    final_newline: bool = True
+    exists: bool = True
+
+    @classmethod
+    def read(cls, path: Path) -> TextFile:
+        """Read a UTF-8 text file.
+
+        Raises:
+            PatchError: If the file doesn't exist or is not UTF-8 text.
+        """
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            raise PatchError(path, "file not found") from None
+        except OSError as e:
+            raise PatchError(path, e.strerror or str(e)) from None
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            raise PatchError(path, "not a UTF-8 text file") from None
+        file = cls(path, newline="\r\n" if "\r\n" in text else "\n")
+        file.content = text.replace("\r\n", "\n")
+        return file
+
+    @property
+    def content(self) -> str:
+        """Content with "\\n" line endings."""
+        text = "\n".join(self.lines)
+        if self.lines and self.final_newline:
+            text += "\n"
+        return text
+
+    @content.setter
+    def content(self, text: str) -> None:
+        self.final_newline = text.endswith("\n") or not text
+        self.lines = text.removesuffix("\n").split("\n") if text else []
+
+    def text(self) -> str:
+        """Content with the file's line endings."""
+        return self.content.replace("\n", self.newline)
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write a file through a temporary file and a rename, keeping its permissions.
+
+    Readers see either the old or the new content, never a partial write.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as fp:
+            fp.write(text)
+        os.chmod(tmp, path.stat().st_mode & 0o7777 if path.exists() else NEW_FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _find_block(lines: list[str], block: list[str], ignore_whitespace: bool = False) -> list[int]:
+    """Start indexes of every occurrence of block in lines."""
+    if not block:
+        return []
+    if ignore_whitespace:
+        lines = [_normalize(line) for line in lines]
+        block = [_normalize(line) for line in block]
+    first = block[0]
+    size = len(block)
+    return [
+        i
+        for i in range(len(lines) - size + 1)
+        if lines[i] == first and lines[i : i + size] == block
+    ]
+
+
+def _indent(line: str) -> str:
+    return line[: len(line) - len(line.lstrip())]
+
+
+def _reindent(new: list[str], old: list[str], found: list[str]) -> list[str]:
+    """Shift the indentation of new lines by how far the found lines are from the old ones."""
+    old_first = next((line for line in old if line.strip()), "")
+    found_first = next((line for line in found if line.strip()), "")
+    have, want = _indent(old_first), _indent(found_first)
+    if have == want:
+        return new
+    if want.startswith(have):
+        extra = want[len(have) :]
+        return [extra + line if line.strip() else line for line in new]
+    if have.startswith(want):
+        cut = len(have) - len(want)
+        return [line[cut:] if line[:cut].isspace() else line for line in new]
+    return new
+
+
+def closest_match(lines: list[str], block: list[str]) -> str:
+    """Describe where the lines most similar to a missing block are, "" if none is close."""
+    anchor = next((i for i, line in enumerate(block) if line.strip()), None)
+    if anchor is None or not lines:
+        return ""
+    normalized = [_normalize(line) for line in lines]
+    first = _normalize(block[anchor])
+    size = min(len(block), len(lines))
+    # Only blocks around lines resembling the first non-blank line are scored
+    starts = {
+        max(0, min(i - anchor, len(lines) - size))
+        for i, line in enumerate(normalized)
+        if line and difflib.SequenceMatcher(None, first, line).quick_ratio() >= CLOSEST_MATCH_RATIO
+    }
+    wanted = "\n".join(_normalize(line) for line in block)
+    best_ratio, best_start = 0.0, 0
+    for start in sorted(starts):
+        window = "\n".join(normalized[start : start + size])
+        ratio = difflib.SequenceMatcher(None, wanted, window).ratio()
+        if ratio > best_ratio:
+            best_ratio, best_start = ratio, start
+    if best_ratio < CLOSEST_MATCH_RATIO:
+        return ""
+    quoted = lines[best_start : best_start + min(size, CLOSEST_MATCH_LINES)]
+    body = "\n".join(f"  {best_start + 1 + i}: {line}" for i, line in enumerate(quoted))
+    return f"closest match ({best_ratio:.0%} similar) at line {best_start + 1}:\n{body}"
+
+
+def _split(text: str) -> list[str]:
+    """Lines of a text, without the line ending of the last one."""
+    return text.replace("\r\n", "\n").removesuffix("\n").split("\n")
+
+
+def _describe(path: Path) -> str:
+    try:
+        return str(path.relative_to(Path.cwd()))
+    except ValueError:
+        return str(path)
+
+
+def _line_count(text: str) -> int:
+    return text.removesuffix("\n").count("\n") + 1 if text else 0
+
+
+def patch_file(path: str | os.PathLike[str], old: str, new: str, count: int = 1) -> str:
+    """Replace old with new in a file and write it atomically.
+
+    The old text is matched exactly first, then line by line ignoring
+    whitespace differences; in that case the new text is re-indented to the
+    indentation found in the file.
+
+    Args:
+        path: File to edit.
+        old: Text to replace, including enough lines to be unique.
+        new: Replacement text.
+        count: Number of occurrences expected, all of them replaced.
+
+    Returns:
+        One-line report, e.g. "patched app.py:12 (-3 +4 lines)".
+
+    Raises:
+        PatchError: If old is not found exactly count times. Nothing is written.
+    """
+    file = TextFile.read(Path(path))
+    old, new = old.replace("\r\n", "\n"), new.replace("\r\n", "\n")
+    if not old.strip():
+        raise PatchError(file.path, "old text is empty")
+
+    content = file.content
+    old_lines = _split(old)
+    found = [match.start() for match in re.finditer(re.escape(old), content)]
+    how = ""
+    if found:
+        lines = [content.count("\n", 0, pos) + 1 for pos in found]
+    else:
+        lines = [start + 1 for start in _find_block(file.lines, old_lines, True)]
+        how = ", whitespace ignored"
+    if not lines:
+        hint = closest_match(file.lines, old_lines)
+        raise PatchError(file.path, "old text not found" + (f"; {hint}" if hint else ""))
+    if len(lines) != count:
+        where = ", ".join(map(str, lines[:10]))
+        raise PatchError(
+            file.path,
+            f"old text found {len(lines)} times (lines {where}), expected {count}; "
+            "include more surrounding lines or pass count",
+        )
+
+    if found:
+        file.content = content.replace(old, new)
+    else:
+        new_lines = _split(new) if new else []
+        for line in reversed(lines):
+            start, end = line - 1, line - 1 + len(old_lines)
+            replacement = _reindent(new_lines, old_lines, file.lines[start:end])
+            file.lines[start:end] = replacement
+    write_atomic(file.path, file.text())
+
+    times = f" x{count}" if count > 1 else ""
+    return (
+        f"patched {_describe(file.path)}:{lines[0]} "
+        f"(-{_line_count(old)} +{_line_count(new)} lines{times}{how})"
+    )
+
+
+@dataclass
+class Hunk:
+    """One @@ section of a unified diff."""
+
+    line: int | None
+    old: list[str] = field(default_factory=list)
+    new: list[str] = field(default_factory=list)
+    removed: int = 0
+    added: int = 0
+    old_final_newline: bool = True
+    new_final_newline: bool = True
+
+
+@dataclass
+class FileDiff:
+    """Changes to one file in a unified diff."""
+
+    old_path: str
+    new_path: str
+    hunks: list[Hunk] = field(default_factory=list)
+
+
+def _diff_path(header: str) -> str:
+    return header[4:].split("\t")[0].strip()
+
+
+def parse_diff(diff: str) -> list[FileDiff]:
+    """Parse a unified diff, as produced by diff -u or git diff.
+
+    Hunk line counts are not trusted (models often get them wrong); a hunk
+    ends at the next @@, file header or git extended header ("diff --git",
+    "index ...", "new file mode ..."), or at any line that isn't a hunk line.
+    Empty lines inside a hunk are taken as context lines that lost their
+    space, trailing ones are dropped. Hunks without line numbers ("@@ @@")
+    are located by their content alone.
+
+    Raises:
+        PatchError: If the diff contains no file headers or hunks.
+    """
+    files: list[FileDiff] = []
+    lines = _split(diff)
+    hunk: Hunk | None = None
+    blank = 0  # Empty lines seen in the hunk, context unless the hunk ends
+    last_sign = " "
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            files.append(FileDiff(_diff_path(line), _diff_path(lines[i + 1])))
+            hunk = None
+            i += 2
+            continue
+        if line.startswith("@@"):
+            if not files:
+                raise PatchError(None, "hunk before the ---/+++ file header")
+            match = _HUNK_HEADER.match(line)
+            hunk = Hunk(int(match.group(1)) if match else None)
+            files[-1].hunks.append(hunk)
+            blank = 0
+        elif hunk is None:
+            pass
+        elif not line:
+            blank += 1
+        elif line[0] not in " +-\\":
+            # Anything else, e.g. git's "diff --git" and "index" lines, ends the hunk
+            hunk = None
+        elif line[0] == "\\":
+            if last_sign in " -":
+                hunk.old_final_newline = False
+            if last_sign in " +":
+                hunk.new_final_newline = False
+        else:
+            context = [""] * blank
+            hunk.old.extend(context)
+            hunk.new.extend(context)
+            blank = 0
+            sign, text = line[0], line[1:]
+            if sign in " -":
+                hunk.old.append(text)
+            if sign in " +":
+                hunk.new.append(text)
+            hunk.removed += sign == "-"
+            hunk.added += sign == "+"
+            last_sign = sign
+        i += 1
+    if not any(f.hunks for f in files):
+        raise PatchError(None, "no hunks found in the diff")
+    return files
+
+
+def _resolve(root: Path, old_path: str, new_path: str) -> tuple[Path | None, Path | None]:
+    """Paths of the old and new file, dropping git's a/ and b/ prefixes."""
+    named = [
+        (name, prefix)
+        for name, prefix in ((old_path, "a/"), (new_path, "b/"))
+        if name != "/dev/null"
+    ]
+    strip = all(name.startswith(prefix) for name, prefix in named) and (
+        # A lone b/new_file could also be a real b/ directory
+        len(named) == 2 or not (root / named[0][1]).is_dir()
+    )
+
+    def resolve(name: str, prefix: str) -> Path | None:
+        if name == "/dev/null":
+            return None
+        return root / (name.removeprefix(prefix) if strip else name)
+
+    return resolve(old_path, "a/"), resolve(new_path, "b/")
+
+
+def _locate(lines: list[str], hunk: Hunk, expected: int) -> tuple[int, bool]:
+    """Index where a hunk's old lines are, closest to the expected index.
+
+    Returns:
+        The index (-1 if not found) and whether whitespace had to be ignored.
+    """
+    if not hunk.old:
+        return min(max(expected, 0), len(lines)), False
+    for ignore_whitespace in (False, True):
+        starts = _find_block(lines, hunk.old, ignore_whitespace)
+        if starts:
+            return min(starts, key=lambda start: abs(start - expected)), ignore_whitespace
+    return -1, False
+
+
+def apply_diff(diff: str, root: str | os.PathLike[str] | None = None) -> str:
+    """Apply a unified diff, writing each changed file atomically.
+
+    Every hunk is located before anything is written, so a diff either applies
+    completely or not at all. Hunks whose context moved are found by content,
+    nearest to the line they claim; whitespace differences are tolerated.
+
+    Args:
+        diff: Unified diff text. Files can be created (--- /dev/null) or deleted
+            (+++ /dev/null).
+        root: Directory the paths in the diff are relative to (default: the
+            current directory).
+
+    Returns:
+        Report with one line per file, e.g. "patched app.py: 2 hunks (-3 +5 lines)".
+
+    Raises:
+        PatchError: If the diff can't be parsed or a hunk doesn't match. Nothing is written.
+    """
+    base = Path(root) if root is not None else Path()
+    # New content of every file touched so far, None for deleted files
+    writes: dict[Path, TextFile | None] = {}
+    report: list[str] = []
+    for file_diff in parse_diff(diff):
+        old_path, new_path = _resolve(base, file_diff.old_path, file_diff.new_path)
+        target = new_path or old_path
+        if target is None:
+            raise PatchError(None, "diff header has /dev/null on both sides")
+        if old_path is None:
+            file = TextFile(target, exists=False)
+        else:
+            pending = writes.get(old_path)
+            file = pending if pending is not None else TextFile.read(old_path)
+
+        offset = 0
+        removed = added = 0
+        fuzzy = False
+        for number, hunk in enumerate(file_diff.hunks, 1):
+            # A hunk without old lines inserts after its line, others start at it
+            line = hunk.line or 0
+            expected = (line if not hunk.old else max(line - 1, 0)) + offset
+            start, fuzzy_hunk = _locate(file.lines, hunk, expected)
+            if start < 0:
+                hint = closest_match(file.lines, hunk.old)
+                raise PatchError(
+                    target,
+                    f"hunk {number} does not match" + (f"; {hint}" if hint else ""),
+                )
+            end = start + len(hunk.old)
+            replacement = hunk.new
+            if fuzzy_hunk:
+                fuzzy = True
+                replacement = _reindent(hunk.new, hunk.old, file.lines[start:end])
+            if end == len(file.lines):
+                file.final_newline = hunk.new_final_newline
+            file.lines[start:end] = replacement
+            offset += len(hunk.new) - len(hunk.old)
+            removed += hunk.removed
+            added += hunk.added
+
+        name = _describe(target)
+        if new_path is None:
+            writes[target] = None
+            report.append(f"deleted {name}")
+            continue
+        if old_path is not None and new_path != old_path:
+            writes[old_path] = None
+            name = f"{_describe(old_path)} -> {name}"
+        file.path = new_path
+        writes[new_path] = file
+        verb = "patched" if file.exists else "created"
+        hunks = len(file_diff.hunks)
+        report.append(
+            f"{verb} {name}: {hunks} hunk{'s' if hunks > 1 else ''} "
+            f"(-{removed} +{added} lines{', whitespace ignored' if fuzzy else ''})"
+        )
+
+    for path, content in writes.items():
+        if content is None:
+            path.unlink(missing_ok=True)
+        else:
+            write_atomic(path, content.text())
+    return "\n".join(report)
@@ -2,17 +2,24 @@
 
 from __future__ import annotations
 
+import sys
 from typing import TYPE_CHECKING
 
 from rich.console import Console
 from rich.markdown import Markdown
+from rich.markup import escape
+from rich.text import Text
 
-from .utils import create_code_panel, format_tokens, get_timestamp
+from .utils import create_code_panel, create_profile_text, format_tokens, get_timestamp
 
 if TYPE_CHECKING:
     from pydantic_ai.usage import RunUsage
 
-console = Console()
+    from .debuglog import DebugLog
+
+# Bound to the real stdout: snippets redirect sys.stdout to a stream that
+# forwards to Printer.output(), which must not print into that stream again
+console = Console(file=sys.__stdout__)
 
 
 class Printer:
@@ -23,24 +30,33 @@ class Printer:
         *,
         show_timestamps: bool = True,
         show_code: bool = True,
-        debug: bool = False,
+        debug_log: DebugLog | None = None,
     ) -> None:
         self.show_timestamps = show_timestamps
         self.show_code = show_code
-        self.debug = debug
-        self.total_tokens = 0
+        self.debug_log = debug_log
+        self.debug = debug_log is not None
+        self.input_tokens = 0
+        self.output_tokens = 0
 
     def _prefix(self) -> str:
-        """Return the prefix with timestamp and token count."""
+        """Return the prefix with timestamp and prompt/completion token counts."""
         parts = []
         if self.show_timestamps:
             parts.append(f"[{get_timestamp('%d/%m/%Y %H:%M:%S')}]")
-        parts.append(f"[{format_tokens(self.total_tokens)}]")
+        tokens = f"in {format_tokens(self.input_tokens)} · out {format_tokens(self.output_tokens)}"
+        parts.append(escape(f"[{tokens}]"))
         return f"[dim]{' '.join(parts)}[/dim] "
 
+    @property
+    def total_tokens(self) -> int:
+        """Prompt and completion tokens used so far."""
+        return self.input_tokens + self.output_tokens
+
     def add_usage(self, usage: RunUsage) -> None:
-        """Add usage from a turn to the running total."""
-        self.total_tokens += usage.total_tokens
+        """Add usage from a turn to the running totals."""
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
 
     def user(self, message: str) -> None:
         """Print user message."""
@@ -71,7 +87,23 @@ class Printer:
         panel = create_code_panel(code, description)
         console.print(panel)
 
-    def debug_msg(self, label: str, message: str) -> None:
-        """Print debug message (only if debug mode is enabled)."""
-        if self.debug:
-            console.print(f"{self._prefix()}[dim cyan][DEBUG {label}][/dim cyan] {message}")
+    def output(self, text: str) -> None:
+        """Print streamed output of a running code block."""
+        if not self.show_code:
+            return
+        console.print(Text(text, style="dim"), end="")
+
+    def profile(self, report: str) -> None:
+        """Print the profile of a finished code block."""
+        if not self.show_code:
+            return
+        console.print(create_profile_text(report))
+
+    def debug_msg(self, label: str, message: object) -> None:
+        """Queue a debug message (only if debug mode is enabled).
+
+        Formatting is deferred to the debug log's writer thread, so values can
+        be passed as they are instead of their repr().
+        """
+        if self.debug_log is not None:
+            self.debug_log.emit(label, message)
@@ -0,0 +1,268 @@
+"""Opt-in profiling of run_python snippets."""
+
+from __future__ import annotations
+
+import cProfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .snippets import SNIPPET_FILENAME_PREFIX
+
+# Start of the result entry holding a snippet's profile
+PROFILE_PREFIX = "profile: "
+# Functions listed by _profile() unless another top is given
+DEFAULT_PROFILE_TOP = 10
+# Snippet helpers doing bookkeeping rather than the snippet's work, see _own_frames()
+HELPER_FUNCTIONS = frozenset({"_profile", "_return"})
+
+_PACKAGE_DIR = str(Path(__file__).parent)
+
+# pstats entries: (filename, line, name) -> (primitive calls, calls, own, cumulative, callers)
+Stats = dict[tuple[str, int, str], tuple[int, int, float, float, dict[Any, Any]]]
+
+# Profilers measuring the running code, innermost last
+_active: list[Profiler] = []
+
+
+@dataclass
+class ProfileOptions:
+    """What to measure around each snippet.
+
+    Attributes:
+        top: Number of functions listed from cProfile, 0 to skip cProfile.
+    """
+
+    top: int = 0
+
+
+@dataclass
+class ProfileReport:
+    """Measurements of one profiled run."""
+
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_bytes: int | None = None
+    top: list[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        """One-line summary, e.g. "1.20s wall, 0.95s CPU, peak 12.3 MB"."""
+        parts = [f"{self.wall:.2f}s wall", f"{self.cpu:.2f}s CPU"]
+        if self.peak_bytes is not None:
+            parts.append(f"peak {format_bytes(self.peak_bytes)}")
+        return ", ".join(parts)
+
+    def format(self) -> str:
+        """Summary followed by the top functions, one per line."""
+        return "\n".join([self.summary(), *self.top])
+
+
+def format_bytes(count: int) -> str:
+    """Format a byte count with a binary unit, e.g. "12.3 MB"."""
+    size = float(count)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{count} B"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _location(filename: str, line: int, name: str) -> str:
+    if filename == "~":
+        # Built-in functions
+        return name
+    if not filename.startswith(SNIPPET_FILENAME_PREFIX):
+        filename = "/".join(Path(filename).parts[-2:])
+    return f"{name} ({filename}:{line})"
+
+
+def _snapshot(profile: cProfile.Profile) -> Stats:
+    """Stats collected so far, without disabling the profile.
+
+    Disabling it would make it forget the running frames, so the calls they
+    make afterwards would have no caller.
+    """
+    profile.snapshot_stats()
+    stats: Stats = dict(profile.stats)
+    return stats
+
+
+def _difference(after: Stats, before: Stats) -> Stats:
+    """Stats of the calls made between two snapshots of the same profile."""
+    delta: Stats = {}
+    for key, (primitive, calls, own, cumulative, callers) in after.items():
+        b_primitive, b_calls, b_own, b_cumulative, b_callers = before.get(
+            key, (0, 0, 0.0, 0.0, {})
+        )
+        if calls > b_calls:
+            delta[key] = (
+                primitive - b_primitive,
+                calls - b_calls,
+                own - b_own,
+                cumulative - b_cumulative,
+                {
+                    caller: counts
+                    for caller, counts in callers.items()
+                    if caller not in b_callers or counts[1] > b_callers[caller][1]
+                },
+            )
+    return delta
+
+
+def _is_profiler(key: tuple[str, int, str]) -> bool:
+    filename, _, name = key
+    return (
+        filename == __file__
+        or "_lsprof.Profiler" in name
+        or (filename.startswith(_PACKAGE_DIR) and name in HELPER_FUNCTIONS)
+    )
+
+
+def _own_frames(stats: Stats) -> set[tuple[str, int, str]]:
+    """Frames of the profiler itself, left out of the top functions.
+
+    These are the frames of this module and of the bookkeeping helpers, and
+    everything only they call (timers, tracemalloc, dataclass constructors...),
+    except the function profiled by profile_call(), see _call_profiled().
+    """
+    own = {key for key in stats if _is_profiler(key)}
+    changed = True
+    while changed:
+        changed = False
+        for key, (*_, callers) in stats.items():
+            if (
+                key not in own
+                and callers
+                and all(
+                    (caller in own or _is_profiler(caller)) and caller[2] != "_call_profiled"
+                    for caller in callers
+                )
+            ):
+                own.add(key)
+                changed = True
+    return own
+
+
+def top_functions(stats: Stats, limit: int) -> list[str]:
+    """Functions with the most own time, formatted as "  time  calls  location"."""
+    own_frames = _own_frames(stats)
+    entries = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)
+    lines = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in entries:
+        if (filename, line, name) in own_frames:
+            continue
+        lines.append(
+            f"  {own:.3f}s own  {cumulative:.3f}s total  {calls}x  "
+            f"{_location(filename, line, name)}"
+        )
+        if len(lines) == limit:
+            break
+    return lines
+
+
+class Profiler:
+    """Context manager measuring wall/CPU time, peak memory and optionally cProfile.
+
+    CPU time is the time of the calling thread, so it doesn't include
+    subprocesses or other threads.
+
+    Profilers can be nested, e.g. _profile() in a snippet run with --profile-top.
+    cProfile can't be, so an inner profiler reads its functions from the
+    difference of the outer cProfile's stats, and the outer peak memory is kept
+    across the inner reset of the peak.
+    """
+
+    def __init__(self, options: ProfileOptions) -> None:
+        self.options = options
+        self.report = ProfileReport()
+        self._profile: cProfile.Profile | None = None
+        self._outer_profile: cProfile.Profile | None = None
+        self._before: Stats = {}
+        self._started_tracing = False
+        self._peak = 0
+        self._base = 0
+        self._wall = 0.0
+        self._cpu = 0.0
+
+    def __enter__(self) -> Profiler:
+        if self.options.top:
+            outer_profiles = (p._profile or p._outer_profile for p in reversed(_active))
+            self._outer_profile = next((p for p in outer_profiles if p is not None), None)
+            if self._outer_profile is not None:
+                self._before = _snapshot(self._outer_profile)
+            else:
+                self._profile = cProfile.Profile()
+        self._start()
+        if self._profile is not None:
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Another profiling tool is already active (Python 3.12+)
+                self._profile = None
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+        # Measured in a call of its own, which the outer cProfile sees return
+        # before the snapshot below: calls of a running frame have no caller yet
+        self._stop()
+        if self._profile is not None:
+            self.report.top = top_functions(_snapshot(self._profile), self.options.top)
+        elif self._outer_profile is not None:
+            after = _snapshot(self._outer_profile)
+            self.report.top = top_functions(_difference(after, self._before), self.options.top)
+
+    def _start(self) -> None:
+        outer = _active[-1] if _active else None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        elif outer is not None:
+            # Resetting the peak below would lose the outer one
+            outer._peak = max(outer._peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+        _active.append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def _stop(self) -> None:
+        self.report.cpu = time.thread_time() - self._cpu
+        self.report.wall = time.perf_counter() - self._wall
+        peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+        self.report.peak_bytes = max(peak - self._base, 0)
+        _active.remove(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+
+
+def profile_call(
+    fn: Callable[..., Any],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+    top: int = DEFAULT_PROFILE_TOP,
+) -> tuple[Any, ProfileReport]:
+    """Call fn(*args, **kwargs) under the profiler.
+
+    Returns:
+        The return value of fn and the profile of the call.
+    """
+    with Profiler(ProfileOptions(top=top)) as profiler:
+        value = _call_profiled(fn, args, kwargs)
+    return value, profiler.report
+
+
+def _call_profiled(fn: Callable[..., Any], args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+    """Call the function profiled by profile_call(), the only non-profiler code it calls."""
+    return fn(*args, **kwargs)
+
+
+def split_profile(result: list[Any]) -> tuple[list[Any], str | None]:
+    """Separate the profile entry appended to a snippet result, if any."""
+    if result and isinstance(result[-1], str) and result[-1].startswith(PROFILE_PREFIX):
+        return result[:-1], result[-1].removeprefix(PROFILE_PREFIX)
+    return result, None
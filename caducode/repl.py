@@ -2,65 +2,185 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import asyncio
+import signal
+import sys
+import threading
+from contextlib import suppress
+from typing import TYPE_CHECKING, TextIO
 
 from pydantic_ai import Agent
 
-from .config import MODEL_SETTINGS
+from .budget import Budget, TurnResult, run_turn
+from .execution import CancelToken
 from .printer import Printer, console
+from .tokens import TokenAccounting
 
 if TYPE_CHECKING:
     from pydantic_ai.messages import ModelMessage
 
+# Seconds between checks that an interrupted snippet has stopped
+CANCEL_POLL_INTERVAL = 0.05
 
-async def run_prompt(agent: Agent[None, str], prompt: str, printer: Printer) -> None:
+
+class LineReader:
+    """Read lines from a stream in a background thread, keeping the event loop free.
+
+    Lines typed while a turn runs are queued and become the next prompts.
+    """
+
+    def __init__(self, stream: TextIO | None = None) -> None:
+        self._stream = stream if stream is not None else sys.stdin
+        self._loop = asyncio.get_running_loop()
+        # None marks the end of input
+        self._queue: asyncio.Queue[str | None] = asyncio.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _put(self, line: str | None) -> None:
+        # The loop is closed if the session ended while the thread was reading
+        with suppress(RuntimeError):
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, line)
+
+    def _read(self) -> None:
+        while True:
+            try:
+                line = self._stream.readline()
+            except (OSError, ValueError):
+                line = ""
+            if not line:
+                self._put(None)
+                return
+            self._put(line.rstrip("\n"))
+
+    @property
+    def pending(self) -> int:
+        """Number of lines typed ahead and not read yet."""
+        return self._queue.qsize()
+
+    async def readline(self) -> str | None:
+        """Wait for the next line, None at end of input."""
+        return await self._queue.get()
+
+    def close(self) -> None:
+        """End input, e.g. when the user presses Ctrl+C at the prompt."""
+        self._queue.put_nowait(None)
+
+
+def print_turn(turn: TurnResult, printer: Printer, budget: Budget) -> None:
+    """Print the answer of a turn, and why it was stopped if the budget ran out."""
+    if turn.output.strip():
+        printer.assistant(turn.output, usage=turn.usage)
+    else:
+        printer.add_usage(turn.usage)
+    if turn.stopped:
+        remaining = budget.describe_remaining()
+        suffix = f" ({remaining})" if remaining else ""
+        printer.system(f"[yellow]Stopped: {turn.stopped}[/yellow]{suffix}")
+
+
+async def run_prompt(
+    agent: Agent[None, str],
+    prompt: str,
+    printer: Printer,
+    budget: Budget,
+) -> None:
     """Run a single prompt and print the result."""
     printer.user(prompt)
-    printer.debug_msg("AGENT", "Starting agent.run()...")
+    printer.debug_msg("AGENT", "Starting agent run...")
     try:
-        result = await agent.run(
-            prompt,
-            model_settings=MODEL_SETTINGS,
-        )
-        printer.debug_msg("AGENT", "agent.run() completed")
-        if result.output and result.output.strip():
-            printer.assistant(result.output, usage=result.usage())
+        turn = await run_turn(agent, prompt, budget)
+        printer.debug_msg("AGENT", "Agent run completed")
+        print_turn(turn, printer, budget)
     except Exception as e:
         printer.error(str(e))
 
 
-async def repl(agent: Agent[None, str], printer: Printer) -> None:
-    """Run the interactive REPL loop."""
+async def repl(
+    agent: Agent[None, str],
+    printer: Printer,
+    budget: Budget,
+    cancel: CancelToken | None = None,
+    accounting: TokenAccounting | None = None,
+) -> None:
+    """Run the interactive REPL loop.
+
+    Input is read without blocking the event loop. Ctrl+C cancels the running
+    turn (and its snippet, through `cancel`); at the prompt it ends the session.
+    "/tokens" prints the biggest context consumers, from `accounting`.
+    """
     message_history: list[ModelMessage] = []
+    reader = LineReader()
+    loop = asyncio.get_running_loop()
+    turn_task: asyncio.Task[TurnResult] | None = None
+
+    def cancel_turn(task: asyncio.Task[TurnResult]) -> None:
+        # A snippet interrupted by the token must be done before its task is cancelled
+        if cancel is not None and cancel.running:
+            loop.call_later(CANCEL_POLL_INTERVAL, cancel_turn, task)
+        else:
+            task.cancel()
 
-    while True:
-        try:
+    def on_interrupt() -> None:
+        if turn_task is None or turn_task.done():
+            reader.close()
+            return
+        if cancel is not None:
+            cancel.cancel()
+        cancel_turn(turn_task)
+
+    # Not supported on every platform, Ctrl+C then raises KeyboardInterrupt as before
+    with suppress(NotImplementedError):
+        loop.add_signal_handler(signal.SIGINT, on_interrupt)
+
+    try:
+        while True:
             prompt_prefix = f"{printer._prefix()}[bold green]USER >>[/bold green] "
             console.print(prompt_prefix, end="")
-            user_input = input()
-        except (EOFError, KeyboardInterrupt):
-            printer.system("\nGoodbye!")
-            break
-
-        if user_input.lower() in ("exit", "quit"):
-            printer.system("Goodbye!")
-            break
-
-        if not user_input.strip():
-            continue
-
-        printer.debug_msg("AGENT", "Starting agent.run()...")
-        try:
-            result = await agent.run(
-                user_input,
-                message_history=message_history,
-                model_settings=MODEL_SETTINGS,
+            typed_ahead = reader.pending > 0
+            user_input = await reader.readline()
+            if user_input is None:
+                printer.system("\nGoodbye!")
+                break
+            if typed_ahead:
+                # Echoed by the terminal while the previous turn was running
+                console.print(user_input, markup=False, highlight=False)
+
+            if user_input.lower() in ("exit", "quit"):
+                printer.system("Goodbye!")
+                break
+
+            if not user_input.strip():
+                continue
+
+            if user_input.strip() == "/tokens":
+                if accounting is not None:
+                    console.print(accounting.report(), style="dim cyan", markup=False)
+                continue
+
+            printer.debug_msg("AGENT", "Starting agent run...")
+            if cancel is not None:
+                cancel.reset()
+            turn_task = asyncio.create_task(
+                run_turn(agent, user_input, budget, message_history=message_history)
             )
-            printer.debug_msg("AGENT", "agent.run() completed")
-            message_history = list(result.all_messages())
+            try:
+                turn = await turn_task
+                printer.debug_msg("AGENT", "Agent run completed")
+                message_history = turn.messages
+                print_turn(turn, printer, budget)
+
+            except asyncio.CancelledError:
+                # Only the turn was cancelled, the session goes on
+                current = asyncio.current_task()
+                if current is not None and current.cancelling():
+                    raise
+                printer.system("\n[yellow]Turn cancelled.[/yellow]")
 
-            if result.output and result.output.strip():
-                printer.assistant(result.output, usage=result.usage())
+            except Exception as e:
+                printer.error(str(e))
 
-        except Exception as e:
-            printer.error(str(e))
+            finally:
+                turn_task = None
+    finally:
+        with suppress(NotImplementedError):
+            loop.remove_signal_handler(signal.SIGINT)
@@ -0,0 +1,284 @@
+"""Static analysis and compile cache for run_python snippets."""
+
+from __future__ import annotations
+
+import ast
+import builtins
+import hashlib
+import linecache
+import threading
+import traceback
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from types import CodeType
+
+# Compiled snippets kept in the cache
+COMPILE_CACHE_SIZE = 256
+# Start of the filename snippets are compiled with
+SNIPPET_FILENAME_PREFIX = "<run_python"
+
+# Method names assumed to modify their object or the outside world
+MUTATING_METHODS = frozenset({
+    "add", "append", "chmod", "clear", "copy", "copyfile", "copytree", "delete", "discard",
+    "extend", "hardlink_to", "insert", "kill", "makedirs", "mkdir", "move", "patch", "pop",
+    "popitem", "post", "put", "remove", "removedirs", "rename", "replace", "reverse",
+    "rmdir", "rmtree", "send", "setdefault", "sort", "symlink_to", "system", "terminate",
+    "touch", "unlink", "update", "write", "write_bytes", "write_text", "writelines",
+})
+# Helpers injected by execute_python() that write files
+MUTATING_HELPERS = frozenset({"_patch", "_apply_diff"})
+# subprocess functions whose command is inspected
+SUBPROCESS_CALLS = frozenset({"run", "call", "check_call", "check_output", "Popen"})
+# Shell commands that only read
+READ_ONLY_COMMANDS = frozenset({
+    "cat", "du", "file", "find", "grep", "head", "ls", "pwd", "rg", "stat", "tail", "tree",
+    "wc", "which",
+})
+READ_ONLY_GIT_COMMANDS = frozenset({
+    "blame", "diff", "grep", "log", "ls-files", "rev-parse", "show", "status",
+})
+
+
+@dataclass
+class SnippetInfo:
+    """Result of analyzing a snippet.
+
+    Attributes:
+        digest: SHA-256 of the source, identifying the snippet in caches and traces.
+        filename: Filename the snippet is compiled with (shows up in tracebacks).
+        code: Compiled code object, None if the source doesn't compile.
+        syntax_error: Formatted SyntaxError if the source doesn't compile.
+        mutating: Whether the snippet may change the namespace or the outside world.
+            Snippets are only classified read-only when that is obvious.
+        bound: Names bound anywhere in the snippet.
+        loaded: Names read anywhere in the snippet.
+    """
+
+    digest: str
+    filename: str
+    code: CodeType | None = None
+    syntax_error: str | None = None
+    mutating: bool = True
+    bound: frozenset[str] = field(default_factory=frozenset)
+    loaded: frozenset[str] = field(default_factory=frozenset)
+
+    def undefined_names(self, *namespaces: Iterable[str]) -> list[str]:
+        """Names read by the snippet but defined neither by it nor in the namespaces.
+
+        Returns no names for snippets with a star import, which binds unknown names.
+        """
+        if "*" in self.bound:
+            return []
+        known = set(self.bound).union(*namespaces)
+        return sorted(
+            name for name in self.loaded if name not in known and not hasattr(builtins, name)
+        )
+
+    def summary(self) -> str:
+        """One-line description for debug output."""
+        if self.syntax_error is not None:
+            return f"{self.digest[:12]} syntax error"
+        kind = "mutating" if self.mutating else "read-only"
+        return f"{self.digest[:12]} {kind}"
+
+
+class _NameCollector(ast.NodeVisitor):
+    """Collect bound/loaded names and decide whether a module is read-only."""
+
+    def __init__(self) -> None:
+        self.bound: set[str] = set()
+        self.loaded: set[str] = set()
+        self.mutating = False
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Load):
+            self.loaded.add(node.id)
+        else:
+            self.bound.add(node.id)
+
+    def visit_Import(self, node: ast.Import) -> None:
+        # Imports are idempotent: they bind names but don't count as mutations
+        for alias in node.names:
+            self.bound.add(alias.asname or alias.name.partition(".")[0])
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        for alias in node.names:
+            self.bound.add(alias.asname or alias.name)
+
+    def _visit_scope(self, node: ast.FunctionDef | ast.AsyncFunctionDef | ast.Lambda) -> None:
+        args = node.args
+        for arg in [*args.posonlyargs, *args.args, *args.kwonlyargs, args.vararg, args.kwarg]:
+            if arg is not None:
+                self.bound.add(arg.arg)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self.bound.add(node.name)
+        self._visit_scope(node)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
+        self.bound.add(node.name)
+        self._visit_scope(node)
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        self._visit_scope(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> None:
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchAs(self, node: ast.MatchAs) -> None:
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchStar(self, node: ast.MatchStar) -> None:
+        if node.name:
+            self.bound.add(node.name)
+
+    def visit_MatchMapping(self, node: ast.MatchMapping) -> None:
+        if node.rest:
+            self.bound.add(node.rest)
+        self.generic_visit(node)
+
+    def visit_Global(self, node: ast.Global) -> None:
+        self.mutating = True
+
+    def visit_Nonlocal(self, node: ast.Nonlocal) -> None:
+        self.bound.update(node.names)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if not isinstance(node.ctx, ast.Load):
+            self.mutating = True
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node: ast.Subscript) -> None:
+        if not isinstance(node.ctx, ast.Load):
+            self.mutating = True
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if _call_mutates(node):
+            self.mutating = True
+        self.generic_visit(node)
+
+
+def _call_mutates(node: ast.Call) -> bool:
+    """Whether a call obviously has side effects."""
+    func = node.func
+    if isinstance(func, ast.Name) and func.id in MUTATING_HELPERS:
+        return True
+    if isinstance(func, ast.Name) and func.id == "open":
+        mode = node.args[1] if len(node.args) > 1 else None
+        for keyword in node.keywords:
+            if keyword.arg == "mode":
+                mode = keyword.value
+        if mode is None:
+            return False
+        if not isinstance(mode, ast.Constant) or not isinstance(mode.value, str):
+            return True
+        return any(flag in mode.value for flag in "wax+")
+
+    if not isinstance(func, ast.Attribute):
+        return False
+    owner = func.value
+    if isinstance(owner, ast.Name) and owner.id == "subprocess":
+        if func.attr not in SUBPROCESS_CALLS:
+            return False
+        return not _read_only_command(node)
+    if isinstance(owner, ast.Name) and owner.id in ("os", "shutil"):
+        return func.attr not in ("getcwd", "listdir", "scandir", "stat", "walk", "getenv")
+    return func.attr in MUTATING_METHODS
+
+
+def _read_only_command(node: ast.Call) -> bool:
+    """Whether a subprocess call runs a literal command known to only read."""
+    if not node.args or not isinstance(node.args[0], ast.List | ast.Tuple):
+        return False
+    words = [w.value if isinstance(w, ast.Constant) else None for w in node.args[0].elts]
+    if not words:
+        return False
+    command, args = words[0], words[1:]
+    if command == "git":
+        return bool(args) and args[0] in READ_ONLY_GIT_COMMANDS
+    if command == "sed":
+        return "-n" in args and "-i" not in args
+    if command == "find":
+        return not any(arg in ("-delete", "-exec", "-execdir", "-ok") for arg in args)
+    return command in READ_ONLY_COMMANDS
+
+
+def _binds_module_names(tree: ast.Module) -> bool:
+    """Whether a module binds or deletes names at module level (imports excluded)."""
+    nodes: list[ast.AST] = list(tree.body)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef):
+            return True
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            return True
+        # Names bound in these are local to them
+        if isinstance(node, ast.Lambda | ast.ListComp | ast.SetComp | ast.DictComp):
+            continue
+        if isinstance(node, ast.GeneratorExp):
+            continue
+        nodes.extend(ast.iter_child_nodes(node))
+    return False
+
+
+_cache: OrderedDict[str, SnippetInfo] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def analyze_snippet(source: str) -> SnippetInfo:
+    """Compile and analyze a snippet, caching the result by source hash.
+
+    The snippet is compiled with a per-digest filename registered in linecache,
+    so tracebacks show the offending source lines.
+
+    Args:
+        source: Python source of the snippet.
+
+    Returns:
+        SnippetInfo for the source.
+    """
+    digest = hashlib.sha256(source.encode()).hexdigest()
+    with _cache_lock:
+        info = _cache.get(digest)
+        if info is not None:
+            _cache.move_to_end(digest)
+            return info
+
+    filename = f"{SNIPPET_FILENAME_PREFIX}:{digest[:8]}>"
+    try:
+        tree = ast.parse(source, filename)
+        code = compile(tree, filename, "exec")
+    except (SyntaxError, ValueError) as e:
+        error = "".join(traceback.format_exception_only(e))
+        info = SnippetInfo(digest=digest, filename=filename, syntax_error=error)
+    else:
+        collector = _NameCollector()
+        collector.visit(tree)
+        info = SnippetInfo(
+            digest=digest,
+            filename=filename,
+            code=code,
+            mutating=collector.mutating or _binds_module_names(tree),
+            bound=frozenset(collector.bound),
+            loaded=frozenset(collector.loaded),
+        )
+        lines = source.splitlines(keepends=True)
+        linecache.cache[filename] = (len(source), None, lines, filename)
+
+    with _cache_lock:
+        _cache[digest] = info
+        while len(_cache) > COMPILE_CACHE_SIZE:
+            _, evicted = _cache.popitem(last=False)
+            linecache.cache.pop(evicted.filename, None)
+    return info
@@ -0,0 +1,302 @@
+"""Local token accounting: prompt size estimates and per-message attribution.
+
+Token counts come from tiktoken when it is installed and its encoding can be
+loaded, otherwise from a heuristic. Either way, estimates are calibrated
+against the prompt token counts the model reports, so they converge on the
+model's own tokenizer after the first request.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import re
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RetryPromptPart,
+    SystemPromptPart,
+    TextPart,
+    ThinkingPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import RequestUsage
+
+from .utils import format_tokens
+
+# tiktoken encoding used as the local tokenizer, when available
+TIKTOKEN_ENCODING = "cl100k_base"
+# Tokens added by the chat template around each message part
+PART_OVERHEAD = 4
+# Context consumers listed by TokenAccounting.report()
+DEFAULT_TOP_CONSUMERS = 10
+# Characters of a message shown as its label
+LABEL_CHARS = 50
+# Distinct texts whose token count is remembered
+COUNT_CACHE_SIZE = 4096
+
+# Heuristic: words split every 5 characters, each symbol and line break one token
+_TOKEN_PIECES = re.compile(r"\w{1,5}|[^\w\s]|\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """Heuristic token count, used when no tokenizer is available."""
+    return len(_TOKEN_PIECES.findall(text))
+
+
+class TokenCounter:
+    """Counts the tokens of texts, remembering the counts of recent texts.
+
+    The history is counted again before every request, so most texts are
+    counted once and then found in the cache.
+    """
+
+    def __init__(self, encode: Callable[[str], list[int]] | None = None, name: str = "") -> None:
+        self.name = name if encode is not None else "heuristic"
+
+        def count(text: str) -> int:
+            return len(encode(text)) if encode is not None else estimate_tokens(text)
+
+        self.count: Callable[[str], int] = functools.lru_cache(maxsize=COUNT_CACHE_SIZE)(count)
+
+
+def create_counter() -> TokenCounter:
+    """Return a tiktoken counter if possible, else the heuristic one."""
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+    except Exception:
+        # Not installed, or its encoding can't be downloaded
+        return TokenCounter()
+    return TokenCounter(
+        functools.partial(encoding.encode, disallowed_special=()),
+        f"tiktoken {TIKTOKEN_ENCODING}",
+    )
+
+
+@dataclass
+class ContextEntry:
+    """Part of a prompt and its estimated size.
+
+    Attributes:
+        index: Index of the message in the history, None for tool definitions.
+        kind: What the part is, e.g. "user", "tool call", "tool result".
+        label: Short description, e.g. the first line of the text.
+        tokens: Estimated tokens, before calibration.
+    """
+
+    index: int | None
+    kind: str
+    label: str
+    tokens: int
+
+
+def _label(text: str) -> str:
+    line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    return line if len(line) <= LABEL_CHARS else line[: LABEL_CHARS - 1] + "…"
+
+
+def _parts(messages: list[ModelMessage]) -> Iterator[tuple[int, str, str, str]]:
+    """(message index, kind, text, label) of every part sent to the model."""
+    # Tool results are labelled with the description of their call
+    calls: dict[str, str] = {}
+    for index, message in enumerate(messages):
+        if isinstance(message, ModelRequest):
+            for part in message.parts:
+                if isinstance(part, SystemPromptPart):
+                    yield index, "system prompt", part.content, _label(part.content)
+                elif isinstance(part, UserPromptPart):
+                    text = part.content if isinstance(part.content, str) else str(part.content)
+                    yield index, "user", text, _label(text)
+                elif isinstance(part, ToolReturnPart):
+                    label = calls.get(part.tool_call_id, part.tool_name)
+                    yield index, "tool result", part.model_response_str(), label
+                elif isinstance(part, RetryPromptPart):
+                    text = part.model_response()
+                    yield index, "retry", text, _label(text)
+        elif isinstance(message, ModelResponse):
+            for piece in message.parts:
+                if isinstance(piece, TextPart):
+                    yield index, "assistant", piece.content, _label(piece.content)
+                elif isinstance(piece, ThinkingPart):
+                    yield index, "thinking", piece.content, _label(piece.content)
+                elif isinstance(piece, ToolCallPart):
+                    try:
+                        description = piece.args_as_dict().get("description")
+                    except ValueError:
+                        # Arguments that aren't valid JSON
+                        description = None
+                    label = str(description or piece.tool_name)
+                    calls[piece.tool_call_id] = label
+                    yield index, "tool call", piece.args_as_json_str(), label
+
+
+def context_entries(
+    messages: list[ModelMessage],
+    parameters: ModelRequestParameters | None,
+    counter: TokenCounter,
+) -> list[ContextEntry]:
+    """Estimate the tokens taken by each part of a prompt.
+
+    Args:
+        messages: Message history sent to the model.
+        parameters: Request parameters, whose tool definitions are part of the prompt.
+        counter: Token counter.
+
+    Returns:
+        One entry per message part, plus one for the tool definitions.
+    """
+    entries = [
+        ContextEntry(index, kind, label, counter.count(text) + PART_OVERHEAD)
+        for index, kind, text, label in _parts(messages)
+    ]
+    if parameters is not None and parameters.function_tools:
+        definitions = json.dumps(
+            [
+                [tool.name, tool.description, tool.parameters_json_schema]
+                for tool in parameters.function_tools
+            ]
+        )
+        entries.append(ContextEntry(None, "tools", "tool definitions", counter.count(definitions)))
+    return entries
+
+
+class TokenAccounting:
+    """Token usage of a session, and what the next prompt is made of.
+
+    Before each request the prompt is estimated part by part; after it, the
+    prompt tokens reported by the model calibrate the following estimates.
+
+    Attributes:
+        counter: Token counter used for the estimates.
+        prompt_tokens: Prompt tokens of all requests, as reported by the model.
+        completion_tokens: Completion tokens of all requests.
+        requests: Requests made.
+        entries: Parts of the latest prompt, see context_entries().
+        predicted: Calibrated estimate of the latest prompt, in tokens.
+        actual: Prompt tokens of the latest request reported by the model, if any.
+        scale: Reported prompt tokens per estimated token.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter | None = None,
+        on_change: Callable[[], None] | None = None,
+    ) -> None:
+        self.counter = counter if counter is not None else create_counter()
+        self.on_change = on_change
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+        self.entries: list[ContextEntry] = []
+        self.predicted = 0
+        self.actual: int | None = None
+        self.scale = 1.0
+        self._estimated = 0
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
+
+    def predict(
+        self,
+        messages: list[ModelMessage],
+        parameters: ModelRequestParameters | None = None,
+    ) -> int:
+        """Estimate the prompt of a request about to be sent.
+
+        Returns:
+            The calibrated estimate, in tokens.
+        """
+        self.entries = context_entries(messages, parameters, self.counter)
+        self._estimated = sum(entry.tokens for entry in self.entries)
+        self.predicted = round(self._estimated * self.scale)
+        self.actual = None
+        self._changed()
+        return self.predicted
+
+    def record(self, usage: RequestUsage) -> None:
+        """Add the usage reported for a request and recalibrate the estimates."""
+        self.requests += 1
+        self.prompt_tokens += usage.input_tokens
+        self.completion_tokens += usage.output_tokens
+        if usage.input_tokens:
+            self.actual = usage.input_tokens
+            if self._estimated:
+                self.scale = usage.input_tokens / self._estimated
+        self._changed()
+
+    def describe(self) -> str:
+        """Short status: context size and the session's prompt/completion split."""
+        context = format_tokens(self.actual if self.actual is not None else self.predicted)
+        approx = "" if self.actual is not None else "≈"
+        return (
+            f"ctx {approx}{context} · in {format_tokens(self.prompt_tokens)}"
+            f" · out {format_tokens(self.completion_tokens)}"
+        )
+
+    def top(self, limit: int = DEFAULT_TOP_CONSUMERS) -> list[ContextEntry]:
+        """Biggest parts of the latest prompt, calibrated."""
+        biggest = sorted(self.entries, key=lambda entry: entry.tokens, reverse=True)[:limit]
+        return [
+            ContextEntry(entry.index, entry.kind, entry.label, round(entry.tokens * self.scale))
+            for entry in biggest
+        ]
+
+    def report(self, limit: int = DEFAULT_TOP_CONSUMERS) -> str:
+        """Multi-line report: session usage and the biggest context consumers."""
+        lines = [
+            f"Session: {format_tokens(self.prompt_tokens)} prompt + "
+            f"{format_tokens(self.completion_tokens)} completion tokens "
+            f"in {self.requests} requests",
+        ]
+        if not self.entries:
+            return "\n".join(lines)
+        total = max(self.actual if self.actual is not None else self.predicted, 1)
+        size = f"{self.actual} tokens reported, " if self.actual is not None else ""
+        lines.append(
+            f"Last prompt: {size}≈{self.predicted} estimated "
+            f"with {self.counter.name} (calibration x{self.scale:.2f})"
+        )
+        lines.append("Biggest context consumers:")
+        for entry in self.top(limit):
+            where = f"#{entry.index} " if entry.index is not None else ""
+            lines.append(
+                f"  {entry.tokens:>7}  {entry.tokens / total:>4.0%}  "
+                f"{where}{entry.kind}: {entry.label}"
+            )
+        return "\n".join(lines)
+
+
+class AccountingModel(WrapperModel):
+    """Model estimating each prompt before it is sent and recording the usage.
+
+    Wrap it inside a CachedModel, so responses served from the cache are
+    neither counted as spent tokens nor used to calibrate the estimates.
+    """
+
+    def __init__(self, wrapped: Model, accounting: TokenAccounting) -> None:
+        super().__init__(wrapped)
+        self.accounting = accounting
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        """Estimate the prompt, send the request and record its usage."""
+        self.accounting.predict(messages, model_request_parameters)
+        response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        self.accounting.record(response.usage)
+        return response
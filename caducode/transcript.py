@@ -0,0 +1,274 @@
+"""Session transcripts: stored messages and streaming export to Markdown, HTML or JSONL."""
+
+from __future__ import annotations
+
+import html
+import json
+import tempfile
+from collections.abc import Iterable, Iterator
+from contextlib import suppress
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Literal, TextIO
+
+from markdown_it import MarkdownIt
+from pygments import highlight  # type: ignore[import-untyped]
+from pygments.formatters import HtmlFormatter  # type: ignore[import-untyped]
+from pygments.lexers import PythonLexer  # type: ignore[import-untyped]
+
+from . import __version__
+
+ExportFormat = Literal["markdown", "html", "jsonl"]
+EXPORT_FORMATS: tuple[ExportFormat, ...] = ("markdown", "html", "jsonl")
+FORMAT_SUFFIXES: dict[str, ExportFormat] = {
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".html": "html",
+    ".htm": "html",
+    ".jsonl": "jsonl",
+}
+
+# Same theme as the code panels in the terminal (see utils.create_code_panel)
+CODE_THEME = "monokai"
+# Results longer than this are kept truncated in memory, in full on disk
+RESULT_PREVIEW_CHARS = 2000
+
+
+@dataclass(slots=True)
+class StoredMessage:
+    """A stored message for re-rendering on resize."""
+
+    kind: Literal["message", "code"]
+    role: Literal["user", "assistant", "system", "error"] | None = None
+    content: str = ""
+    tokens: int = 0
+    timestamp: str = ""
+    # For code blocks
+    code: str = ""
+    description: str = ""
+    result: str | None = None
+    output: str = ""
+    profile: str | None = None
+    # Full result when `result` only holds a truncated preview
+    result_path: str | None = None
+
+
+class SpillStore:
+    """Temporary directory holding long message fields out of memory."""
+
+    def __init__(self) -> None:
+        self._dir: tempfile.TemporaryDirectory[str] | None = None
+        self._count = 0
+
+    def spill(self, text: str) -> str:
+        """Write text to a new file and return its path."""
+        if self._dir is None:
+            self._dir = tempfile.TemporaryDirectory(prefix="caducode-")
+        self._count += 1
+        path = Path(self._dir.name) / f"{self._count}.txt"
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+    def clear(self) -> None:
+        """Delete all spilled files."""
+        if self._dir is not None:
+            self._dir.cleanup()
+            self._dir = None
+
+
+def compact_result(result: str, store: SpillStore) -> tuple[str, str | None]:
+    """Truncate a long result, spilling the full text to disk.
+
+    Returns:
+        The result (or its truncated preview) and the spill file path, if any.
+    """
+    if len(result) <= RESULT_PREVIEW_CHARS:
+        return result, None
+    try:
+        path = store.spill(result)
+    except OSError:
+        return result, None
+    return result[:RESULT_PREVIEW_CHARS] + "...", path
+
+
+def full_result(msg: StoredMessage) -> str | None:
+    """Return the full result of a message, reading it back from disk if spilled."""
+    if msg.result_path is not None:
+        with suppress(OSError):
+            return Path(msg.result_path).read_text(encoding="utf-8")
+    return msg.result
+
+
+def message_to_dict(msg: StoredMessage) -> dict[str, Any]:
+    """Convert a stored message to a JSON-serializable dict, with its full result."""
+    data = asdict(msg)
+    data["result"] = full_result(msg)
+    del data["result_path"]
+    return data
+
+
+def message_from_dict(data: dict[str, Any]) -> StoredMessage:
+    """Build a stored message from a dict, ignoring unknown keys."""
+    known = {f.name for f in fields(StoredMessage)}
+    return StoredMessage(**{key: value for key, value in data.items() if key in known})
+
+
+def read_jsonl(path: Path) -> Iterator[StoredMessage]:
+    """Lazily read stored messages from a JSONL transcript."""
+    with path.open(encoding="utf-8") as fp:
+        for line in fp:
+            if line.strip():
+                yield message_from_dict(json.loads(line))
+
+
+def format_for_path(path: Path) -> ExportFormat:
+    """Guess the export format from a file suffix.
+
+    Raises:
+        ValueError: If the suffix is not a known export format.
+    """
+    try:
+        return FORMAT_SUFFIXES[path.suffix.lower()]
+    except KeyError:
+        known = ", ".join(FORMAT_SUFFIXES)
+        raise ValueError(f"Unknown transcript format '{path.suffix}' (use {known})") from None
+
+
+def write_jsonl(messages: Iterable[StoredMessage], fp: TextIO) -> None:
+    """Write messages as one JSON object per line."""
+    for msg in messages:
+        fp.write(json.dumps(message_to_dict(msg), ensure_ascii=False))
+        fp.write("\n")
+
+
+def _fence(text: str, lang: str = "") -> str:
+    """Wrap text in a Markdown code fence longer than any backtick run inside it."""
+    longest = run = 0
+    for char in text:
+        run = run + 1 if char == "`" else 0
+        longest = max(longest, run)
+    fence = "`" * max(3, longest + 1)
+    return f"{fence}{lang}\n{text.rstrip()}\n{fence}\n"
+
+
+def write_markdown(messages: Iterable[StoredMessage], fp: TextIO) -> None:
+    """Write messages as a Markdown document."""
+    fp.write(f"# CaduCode transcript\n\n_Exported by CaduCode v{__version__}_\n\n")
+    for msg in messages:
+        if msg.kind == "code":
+            fp.write(f"**● {msg.description}**\n\n")
+            fp.write(_fence(msg.code, "python"))
+            if msg.output:
+                fp.write("\nOutput:\n\n")
+                fp.write(_fence(msg.output))
+            if msg.profile:
+                fp.write("\nProfile:\n\n")
+                fp.write(_fence(msg.profile))
+            result = full_result(msg)
+            if result is not None:
+                fp.write("\nResult:\n\n")
+                fp.write(_fence(result))
+            fp.write("\n")
+        elif msg.role == "user":
+            fp.write(f"### [{msg.timestamp}] USER\n\n{msg.content}\n\n")
+        elif msg.role == "assistant":
+            fp.write(f"### [{msg.timestamp}] Assistant\n\n{msg.content}\n\n")
+        elif msg.role == "error":
+            fp.write(f"> **[{msg.timestamp}] Error:** {msg.content}\n\n")
+        else:
+            fp.write(f"> _[{msg.timestamp}] {msg.content}_\n\n")
+
+
+HTML_STYLE = """
+body { background: #1e1e1e; color: #ddd; font-family: sans-serif; margin: 2em auto;
+       max-width: 60em; line-height: 1.4; }
+.ts { color: #888; font-family: monospace; }
+.user .role { color: #4c4; font-weight: bold; }
+.assistant .role { color: #c4c; font-weight: bold; }
+.system { color: #5aa; }
+.error { color: #e55; }
+.msg { margin: 1em 0; }
+.panel { border: 1px solid #0aa; border-radius: 4px; padding: 0.2em 0.8em; margin: 1em 0;
+         display: inline-block; max-width: 100%; box-sizing: border-box; }
+.panel .title { color: #0cc; font-weight: bold; text-align: center; }
+.panel .desc { color: #cc4; font-style: italic; }
+.panel .output { color: #999; }
+.panel .result { color: #4c4; }
+.panel .profile { color: #69c; }
+.panel pre { white-space: pre-wrap; margin: 0.3em 0; }
+pre, code { font-family: monospace; }
+"""
+
+
+def write_html(messages: Iterable[StoredMessage], fp: TextIO) -> None:
+    """Write messages as a self-contained HTML page with pre-highlighted code."""
+    formatter = HtmlFormatter(style=CODE_THEME, linenos="inline", cssclass="code")
+    lexer = PythonLexer()
+    # Raw HTML in messages is escaped, not passed through into the page
+    markdown = MarkdownIt("commonmark", {"html": False}).enable("table")
+
+    fp.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n')
+    fp.write("<title>CaduCode transcript</title>\n<style>")
+    fp.write(HTML_STYLE)
+    fp.write(formatter.get_style_defs(".code"))
+    fp.write("</style>\n</head>\n<body>\n<h1>CaduCode transcript</h1>\n")
+    fp.write(f"<p class=\"ts\">Exported by CaduCode v{html.escape(__version__)}</p>\n")
+
+    for msg in messages:
+        ts = f'<span class="ts">[{html.escape(msg.timestamp)}]</span>'
+        if msg.kind == "code":
+            fp.write('<div class="panel">\n<div class="title">Agent Code</div>\n')
+            fp.write(f'<div class="desc">● {html.escape(msg.description)}</div>\n')
+            fp.write(highlight(msg.code, lexer, formatter))
+            if msg.output:
+                fp.write(f'<b>Output:</b><pre class="output">{html.escape(msg.output)}</pre>\n')
+            if msg.profile:
+                fp.write(f'<b>Profile:</b><pre class="profile">{html.escape(msg.profile)}</pre>\n')
+            result = full_result(msg)
+            if result is not None:
+                fp.write(f'<b>Result:</b><pre class="result">{html.escape(result)}</pre>\n')
+            fp.write("</div>\n")
+        elif msg.role == "user":
+            fp.write(f'<div class="msg user">{ts} <span class="role">USER &gt;&gt;</span> ')
+            fp.write(f"{html.escape(msg.content)}</div>\n")
+        elif msg.role == "assistant":
+            fp.write(f'<div class="msg assistant">{ts} <span class="role">Assistant:</span>\n')
+            fp.write(markdown.render(msg.content))
+            fp.write("</div>\n")
+        elif msg.role == "error":
+            fp.write(f'<div class="msg error">{ts} <b>Error:</b> ')
+            fp.write(f"{html.escape(msg.content)}</div>\n")
+        else:
+            fp.write(f'<div class="msg system">{ts} {html.escape(msg.content)}</div>\n')
+
+    fp.write("</body>\n</html>\n")
+
+
+WRITERS = {
+    "markdown": write_markdown,
+    "html": write_html,
+    "jsonl": write_jsonl,
+}
+
+
+def export_transcript(
+    messages: Iterable[StoredMessage],
+    path: Path,
+    fmt: ExportFormat | None = None,
+) -> None:
+    """Stream messages to a transcript file.
+
+    Messages are written one at a time, so memory use doesn't grow with the
+    transcript length when `messages` is a lazy iterable (e.g. read_jsonl()).
+
+    Args:
+        messages: Messages to export.
+        path: Destination file.
+        fmt: Export format, guessed from the path suffix when not given.
+
+    Raises:
+        ValueError: If no format is given and the suffix is unknown.
+    """
+    writer = WRITERS[fmt or format_for_path(path)]
+    with path.open("w", encoding="utf-8") as fp:
+        writer(messages, fp)
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import asyncio
+from contextlib import suppress
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
@@ -9,21 +11,35 @@ from pydantic_ai import Agent, RunContext
 from textual import on, work
 from textual.app import App, ComposeResult
 from textual.binding import Binding
-from textual.widgets import Header
+from textual.widgets import Header, Log
 
+from ..budget import Budget, parse_limits, run_turn
+from ..cache import ResponseCache
 from ..config import (
+    DEBUG_PANEL_LINES,
+    DEFAULT_MAX_RENDERED_LINES,
     DEFAULT_MODEL,
     DEFAULT_OLLAMA_URL,
-    MODEL_SETTINGS,
+    DEFAULT_TURN_LIMITS,
+    TRANSCRIPT_NAME_FORMAT,
     create_ollama_model,
 )
-from ..execution import execute_python
+from ..debuglog import DebugLog
+from ..execution import CancelToken, Executor, InProcessExecutor
+from ..failures import FailureTracker
 from ..printer import Printer
+from ..profiling import ProfileOptions, split_profile
 from ..prompts import create_system_prompt, get_cwd
+from ..tokens import TokenAccounting
+from ..transcript import export_transcript
+from ..utils import get_timestamp
 from .widgets import InputBar, MessageView
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from pydantic_ai.messages import ModelMessage
+    from pydantic_ai.usage import RunUsage
 
 
 class CaduCodeApp(App[None]):
@@ -35,6 +51,10 @@ class CaduCodeApp(App[None]):
     BINDINGS = [
         Binding("ctrl+c", "quit", "Quit"),
         Binding("ctrl+l", "clear", "Clear"),
+        Binding("ctrl+g", "cancel", "Cancel"),
+        Binding("ctrl+r", "reset", "Reset Env"),
+        Binding("ctrl+s", "export", "Export"),
+        Binding("f12", "toggle_debug", "Debug", show=False),
         Binding("escape", "focus_input", "Focus Input", show=False),
     ]
 
@@ -43,71 +63,162 @@ class CaduCodeApp(App[None]):
         base_url: str = DEFAULT_OLLAMA_URL,
         model_name: str = DEFAULT_MODEL,
         debug_mode: bool = False,
+        debug_log: DebugLog | None = None,
         show_code_results: bool = False,
+        executor: Executor | None = None,
+        max_rendered_lines: int | None = DEFAULT_MAX_RENDERED_LINES,
+        budget: Budget | None = None,
+        cache: ResponseCache | None = None,
+        profile: ProfileOptions | None = None,
     ) -> None:
         super().__init__()
         self.base_url = base_url
         self.model_name = model_name
         self.debug_mode = debug_mode
+        # Without a debug log (e.g. a file), debug output goes to the debug panel
+        self.debug_log = debug_log
+        self._debug_panel = debug_mode and debug_log is None
         self.show_code_results = show_code_results
+        self.max_rendered_lines = max_rendered_lines
+        self.executor = executor if executor is not None else InProcessExecutor()
+        self.budget = budget if budget is not None else Budget(parse_limits(DEFAULT_TURN_LIMITS))
+        self.cache = cache
+        self.profile = profile
+        self.accounting = TokenAccounting(on_change=self._update_token_counter)
         self.message_history: list[ModelMessage] = []
         self._agent: Agent[None, str] | None = None
+        self._cancel_token: CancelToken | None = None
 
     def compose(self) -> ComposeResult:
         """Create the UI layout."""
         yield Header()
-        yield MessageView(id="message-view", show_code_results=self.show_code_results)
+        yield MessageView(
+            id="message-view",
+            show_code_results=self.show_code_results,
+            max_rendered_lines=self.max_rendered_lines,
+        )
+        if self._debug_panel:
+            yield Log(id="debug-panel", max_lines=DEBUG_PANEL_LINES)
         yield InputBar(id="input-bar")
 
     def on_mount(self) -> None:
         """Initialize when app is mounted."""
+        if self._debug_panel:
+            self.debug_log = DebugLog(self._debug_panel_writer())
         self._agent = self._create_agent()
 
         view = self.query_one("#message-view", MessageView)
         view.add_message("system", f"CaduCode - Model: {self.model_name} @ {self.base_url}")
         view.add_message("system", f"Working directory: {get_cwd()}")
-        view.add_message("system", 'Type a message or "exit" to quit.')
+        view.add_message("system", self.executor.describe())
+        if self.cache is not None and self.cache.enabled:
+            view.add_message("system", self.cache.describe())
+        view.add_message(
+            "system",
+            'Type a message, "/export [file.md|.html|.jsonl]" to save the transcript, '
+            '"/tokens" for the context size or "exit" to quit.',
+        )
+        self._update_token_counter()
 
-        self.query_one("#input-bar", InputBar).focus_input()
+        input_bar = self.query_one("#input-bar", InputBar)
+        input_bar.update_budget(self.budget.describe_remaining())
+        input_bar.focus_input()
+
+    def on_unmount(self) -> None:
+        """Stop the debug panel's writer."""
+        if self._debug_panel and self.debug_log is not None:
+            self.debug_log.close()
+
+    def _debug_panel_writer(self) -> Callable[[list[str]], None]:
+        """Return a DebugLog writer appending to the debug panel without waiting for it."""
+        panel = self.query_one("#debug-panel", Log)
+        loop = asyncio.get_running_loop()
+
+        def write(records: list[str]) -> None:
+            lines = [line for record in records for line in record.splitlines()]
+            # The loop is closed once the app has exited
+            with suppress(RuntimeError):
+                loop.call_soon_threadsafe(panel.write_lines, lines)
+
+        return write
 
     def _create_agent(self) -> Agent[None, str]:
         """Create the PydanticAI agent with TUI integration."""
-        model = create_ollama_model(self.base_url, self.model_name)
+        model = create_ollama_model(self.base_url, self.model_name, self.cache, self.accounting)
 
         agent: Agent[None, str] = Agent(
             model=model,
-            system_prompt=create_system_prompt(),
+            system_prompt=create_system_prompt(what_if=self.executor.supports_what_if),
         )
 
         app = self
+        failures = FailureTracker()
 
         @agent.tool
-        def run_python(ctx: RunContext[None], code: str, description: str) -> list[Any]:
-            """Execute Python code and display in TUI."""
-            del ctx
-
+        def run_python(
+            ctx: RunContext[None],
+            code: str,
+            description: str,
+            what_if: bool = False,
+        ) -> list[Any]:
+            """Execute Python code and display in TUI.
+
+            Args:
+                ctx: PydanticAI run context (required).
+                code: Python code to execute.
+                description: Short description of what this code does (shown to user).
+                what_if: Run in a disposable copy of the environment, kept only on _commit().
+            """
             # Quiet printer for execution (no output to console)
-            printer = Printer(show_code=False, show_timestamps=False, debug=app.debug_mode)
-            result = execute_python(code, printer)
+            printer = Printer(show_code=False, show_timestamps=False, debug_log=app.debug_log)
+
+            # Display code block in TUI right away, output is streamed into it
+            app.call_from_thread(app._add_code_block, code, description)
+
+            def on_output(text: str) -> None:
+                app.call_from_thread(app._append_code_output, text)
+
+            cancel = CancelToken()
+            app._cancel_token = cancel
+            try:
+                result = app.executor.execute(
+                    code,
+                    printer,
+                    on_output=on_output,
+                    cancel=cancel,
+                    what_if=what_if,
+                    profile=app.profile,
+                )
+            finally:
+                app._cancel_token = None
+
+            values, report = split_profile(result)
+            result_str = repr(values) if values else "No output"
+            app.call_from_thread(app._finish_code_block, result_str, report)
+
+            return failures.check(ctx.run_id, result)
 
-            # Display code block in TUI
-            result_str = repr(result) if result else "No output"
-            app.call_from_thread(app._add_code_block, code, description, result_str)
+        return agent
 
-            return result
+    def _add_code_block(self, code: str, description: str) -> None:
+        """Add a running code block to message view (called from thread)."""
+        view = self.query_one("#message-view", MessageView)
+        view.add_code_block(code, description)
 
-        return agent
+    def _append_code_output(self, text: str) -> None:
+        """Stream output of the running code block (called from thread)."""
+        view = self.query_one("#message-view", MessageView)
+        view.append_code_output(text)
 
-    def _add_code_block(self, code: str, description: str, result: str) -> None:
-        """Add code block to message view (called from thread)."""
+    def _finish_code_block(self, result: str, profile: str | None = None) -> None:
+        """Record the result of the running code block (called from thread)."""
         view = self.query_one("#message-view", MessageView)
-        view.add_code_block(code, description, result)
+        view.finish_code_block(result, profile)
 
     def _update_token_counter(self) -> None:
-        """Update the token counter in the input bar."""
-        view = self.query_one("#message-view", MessageView)
+        """Update the context size and prompt/completion split in the input bar."""
         input_bar = self.query_one("#input-bar", InputBar)
-        input_bar.update_tokens(view.total_tokens)
+        input_bar.update_tokens(self.accounting.describe())
 
     @on(InputBar.Submitted)
     def on_input_submitted(self, event: InputBar.Submitted) -> None:
@@ -118,6 +229,15 @@ class CaduCodeApp(App[None]):
             self.exit()
             return
 
+        if message == "/export" or message.startswith("/export "):
+            self.export_transcript(message.removeprefix("/export").strip() or None)
+            return
+
+        if message == "/tokens":
+            view = self.query_one("#message-view", MessageView)
+            view.add_message("system", self.accounting.report())
+            return
+
         view = self.query_one("#message-view", MessageView)
         view.add_message("user", message)
         self.run_agent(message)
@@ -135,31 +255,80 @@ class CaduCodeApp(App[None]):
                 view.add_message("error", "Agent not initialized")
                 return
 
-            result = await self._agent.run(
+            def on_step(usage: RunUsage, seconds: float) -> None:
+                input_bar.update_budget(self.budget.describe_remaining(usage, seconds))
+
+            turn = await run_turn(
+                self._agent,
                 message,
+                self.budget,
                 message_history=self.message_history,
-                model_settings=MODEL_SETTINGS,
+                on_step=on_step,
             )
 
-            self.message_history = list(result.all_messages())
+            self.message_history = turn.messages
 
-            usage = result.usage()
-            tokens = usage.total_tokens if usage else 0
-            if result.output and result.output.strip():
-                view.add_message("assistant", result.output, tokens=tokens)
+            if turn.output.strip():
+                view.add_message("assistant", turn.output, tokens=turn.usage.total_tokens)
+            if turn.stopped:
+                view.add_message("system", f"Stopped: {turn.stopped}")
 
             self._update_token_counter()
 
+        except asyncio.CancelledError:
+            view.add_message("system", "Turn cancelled.")
+            raise
+
         except Exception as e:
             view.add_message("error", str(e))
 
         finally:
+            input_bar.update_budget(self.budget.describe_remaining())
             input_bar.set_loading(False)
 
     async def action_quit(self) -> None:
         """Quit the application."""
         self.exit()
 
+    async def action_cancel(self) -> None:
+        """Cancel the running snippet, or the whole turn if no snippet is running."""
+        if self._cancel_token is not None:
+            self._cancel_token.cancel()
+        else:
+            self.workers.cancel_group(self, "default")
+
+    @work(thread=True, exclusive=True, group="reset")
+    def action_reset(self) -> None:
+        """Reset the execution environment to a fresh namespace."""
+        self.executor.reset()
+        description = self.executor.describe()
+        self.call_from_thread(self._add_system_message, f"Environment reset. {description}")
+
+    def _add_system_message(self, content: str) -> None:
+        """Add a system message to the message view (called from thread)."""
+        view = self.query_one("#message-view", MessageView)
+        view.add_message("system", content)
+
+    @work(thread=True, exclusive=True, group="export")
+    def export_transcript(self, filename: str | None = None) -> None:
+        """Write the transcript to a file, in the format given by its suffix."""
+        path = Path(filename or get_timestamp(TRANSCRIPT_NAME_FORMAT))
+        view = self.query_one("#message-view", MessageView)
+        messages = self.call_from_thread(view.snapshot)
+        try:
+            export_transcript(messages, path)
+        except (OSError, ValueError) as e:
+            self.call_from_thread(view.add_message, "error", f"Export failed: {e}")
+            return
+        note = f"Transcript saved to {path}"
+        if path.suffix == ".jsonl":
+            note += f" (convert with: caducode export {path} -o file.html)"
+        self.call_from_thread(self._add_system_message, note)
+
+    async def action_export(self) -> None:
+        """Save the transcript as JSONL in the working directory."""
+        self.export_transcript()
+
     async def action_clear(self) -> None:
         """Clear the message view."""
         view = self.query_one("#message-view", MessageView)
@@ -167,6 +336,11 @@ class CaduCodeApp(App[None]):
         self._update_token_counter()
         view.add_message("system", "Cleared. Ready for input.")
 
+    async def action_toggle_debug(self) -> None:
+        """Show or hide the debug panel."""
+        for panel in self.query("#debug-panel"):
+            panel.display = not panel.display
+
     async def action_focus_input(self) -> None:
         """Focus the input bar."""
         self.query_one("#input-bar", InputBar).focus_input()
@@ -8,8 +8,6 @@ from textual.containers import Horizontal
 from textual.message import Message
 from textual.widgets import Input, Static
 
-from ...utils import format_tokens
-
 
 class InputBar(Static):
     """Fixed input bar at the bottom of the screen."""
@@ -30,7 +28,8 @@ class InputBar(Static):
         with Horizontal(id="input-container"):
             yield Static("USER >> ", id="input-prompt")
             yield Input(placeholder="Type a message...", id="user-input")
-            yield Static(format_tokens(0), id="token-counter")
+            yield Static("", id="budget")
+            yield Static("", id="token-counter")
 
     @on(Input.Submitted)
     def on_input_submitted(self, event: Input.Submitted) -> None:
@@ -60,10 +59,16 @@ class InputBar(Static):
             prompt.remove_class("loading")
             input_widget.focus()
 
-    def update_tokens(self, total_tokens: int) -> None:
-        """Update the token counter display."""
+    def update_tokens(self, status: str) -> None:
+        """Update the token counter display, e.g. with TokenAccounting.describe()."""
         counter = self.query_one("#token-counter", Static)
-        counter.update(format_tokens(total_tokens))
+        counter.update(status)
+
+    def update_budget(self, remaining: str) -> None:
+        """Update the remaining budget display (hidden when empty)."""
+        budget = self.query_one("#budget", Static)
+        budget.update(remaining)
+        budget.display = bool(remaining)
 
     def focus_input(self) -> None:
         """Focus the input widget."""
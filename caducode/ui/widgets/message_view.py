@@ -2,46 +2,62 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import sys
+from collections import deque
 from typing import Literal
 
 from rich.markdown import Markdown
 from rich.text import Text
-from textual.events import Resize
+from textual.events import MouseScrollDown, MouseScrollUp, Resize
 from textual.widgets import RichLog
 
-from ...utils import create_code_panel, get_timestamp
+from ...transcript import SpillStore, StoredMessage, compact_result
+from ...utils import create_code_panel, create_profile_text, get_timestamp
 
-
-@dataclass
-class StoredMessage:
-    """A stored message for re-rendering on resize."""
-
-    kind: Literal["message", "code"]
-    role: Literal["user", "assistant", "system", "error"] | None = None
-    content: str = ""
-    tokens: int = 0
-    timestamp: str = ""
-    # For code blocks
-    code: str = ""
-    description: str = ""
-    result: str | None = None
+# Maximum characters of streamed output kept per code block (tail is kept)
+MAX_STORED_OUTPUT = 20_000
+# Messages rendered again at a time when scrolling past the rendered window
+REHYDRATE_PAGE = 50
+# Rendered lines assumed for a message not yet rendered at the current width
+ESTIMATED_MESSAGE_LINES = 4
 
 
 class MessageView(RichLog):
-    """Scrollable view of conversation messages with Rich rendering."""
+    """Scrollable view of conversation messages with Rich rendering.
+
+    With max_rendered_lines set, only a window of the messages is kept rendered:
+    older lines are dropped as new ones arrive and rendered again from the stored
+    messages when the user scrolls back to them.
+    """
 
     def __init__(
         self,
         id: str | None = None,  # noqa: A002
         show_code_results: bool = False,
+        max_rendered_lines: int | None = None,
     ) -> None:
-        super().__init__(highlight=True, markup=True, wrap=True, id=id)
-        self.total_tokens = 0
+        super().__init__(
+            highlight=True,
+            markup=True,
+            wrap=True,
+            id=id,
+            max_lines=max_rendered_lines,
+        )
         self.show_code_results = show_code_results
+        self.max_rendered_lines = max_rendered_lines
         self._messages: list[StoredMessage] = []
+        self._running_index: int | None = None
+        self._spill = SpillStore()
+        # messages[_window_start:_window_end] are rendered in the log
+        self._window_start = 0
+        self._window_end = 0
+        # (message index, absolute line its rendering starts at) for the window
+        self._offsets: deque[tuple[int, int]] = deque()
+        # Rendered line count per message index, at the current width
+        self._line_counts: dict[int, int] = {}
+        self._rehydrating = False
 
-    def _render_message(self, msg: StoredMessage) -> None:
+    def _render_message(self, msg: StoredMessage, scroll_end: bool | None = None) -> None:
         """Render a single stored message."""
         if msg.kind == "message":
             if msg.role == "user":
@@ -49,28 +65,28 @@ class MessageView(RichLog):
                 header.append(f"[{msg.timestamp}] ", style="dim")
                 header.append("USER >> ", style="bold green")
                 header.append(msg.content)
-                self.write(header)
+                self.write(header, scroll_end=scroll_end)
 
             elif msg.role == "assistant":
                 header = Text()
                 header.append(f"[{msg.timestamp}] ", style="dim")
                 header.append("Assistant:", style="bold magenta")
-                self.write(header)
-                self.write(Markdown(msg.content))
-                self.write("")
+                self.write(header, scroll_end=scroll_end)
+                self.write(Markdown(msg.content), scroll_end=scroll_end)
+                self.write("", scroll_end=scroll_end)
 
             elif msg.role == "system":
                 text = Text()
                 text.append(f"[{msg.timestamp}] ", style="dim")
                 text.append(msg.content, style="dim cyan")
-                self.write(text)
+                self.write(text, scroll_end=scroll_end)
 
             elif msg.role == "error":
                 text = Text()
                 text.append(f"[{msg.timestamp}] ", style="dim")
                 text.append("Error: ", style="bold red")
                 text.append(msg.content, style="red")
-                self.write(text)
+                self.write(text, scroll_end=scroll_end)
 
         elif msg.kind == "code":
             panel = create_code_panel(
@@ -78,18 +94,166 @@ class MessageView(RichLog):
                 msg.description,
                 result=msg.result,
                 show_result=self.show_code_results,
+                output=msg.output,
+                profile=msg.profile,
             )
-            self.write(panel)
+            self.write(panel, scroll_end=scroll_end)
 
-    def _rerender_all(self) -> None:
-        """Clear and re-render all messages."""
+    # _start_line (lines trimmed by max_lines so far) and _size_known are RichLog
+    # internals, checked against Textual 7.1; revisit them when upgrading Textual.
+    def _render_at(self, index: int, scroll_end: bool | None = None) -> None:
+        """Render the message at index at the end of the log and track its lines."""
+        start = self._start_line + len(self.lines)
+        self._offsets.append((index, start))
+        self._render_message(self._messages[index], scroll_end)
+        if self._size_known:
+            self._line_counts[index] = self._start_line + len(self.lines) - start
+        self._drop_trimmed()
+
+    def _drop_trimmed(self) -> None:
+        """Forget messages whose lines were all trimmed by max_lines."""
+        while len(self._offsets) > 1 and self._offsets[1][1] <= self._start_line:
+            self._offsets.popleft()
+        self._window_start = self._offsets[0][0] if self._offsets else self._window_end
+
+    def _rerender_window(self, start: int, end: int, scroll_end: bool | None = None) -> None:
+        """Clear the log and render messages[start:end]."""
         self.clear()
-        for msg in self._messages:
-            self._render_message(msg)
+        self._offsets.clear()
+        self._window_start = start
+        self._window_end = end
+        for index in range(start, end):
+            self._render_at(index, scroll_end)
+
+    def _is_rendered(self, index: int) -> bool:
+        """Whether the message at index is part of the rendered window."""
+        return self._window_start <= index < self._window_end
+
+    def _following(self) -> bool:
+        """Whether the window reaches the latest message (new messages get rendered)."""
+        return self._window_end == len(self._messages)
+
+    def _estimated_lines(self, index: int) -> int:
+        return self._line_counts.get(index, ESTIMATED_MESSAGE_LINES)
 
     def on_resize(self, event: Resize) -> None:
-        """Re-render all messages when the widget is resized."""
-        self._rerender_all()
+        """Re-render the rendered window when the widget is resized."""
+        self._line_counts.clear()
+        self._rerender_window(self._window_start, self._window_end)
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        """Render earlier or later messages when scrolling past the rendered window."""
+        super().watch_scroll_y(old_value, new_value)
+        if new_value < old_value:
+            self._check_window_top()
+        elif new_value > old_value:
+            self._check_window_bottom()
+
+    def on_mouse_scroll_up(self, event: MouseScrollUp) -> None:
+        """Scrolling up at the top of the window renders earlier messages."""
+        self._check_window_top()
+
+    def on_mouse_scroll_down(self, event: MouseScrollDown) -> None:
+        """Scrolling down at the bottom of the window renders later messages."""
+        self._check_window_bottom()
+
+    def _check_window_top(self) -> None:
+        if self.max_rendered_lines is None or self._rehydrating:
+            return
+        if self.scroll_y <= 0 and self._window_start > 0:
+            self._rehydrating = True
+            self.call_after_refresh(self._show_earlier)
+
+    def _check_window_bottom(self) -> None:
+        if self.max_rendered_lines is None or self._rehydrating:
+            return
+        if self.scroll_y >= self.max_scroll_y and not self._following():
+            self._rehydrating = True
+            self.call_after_refresh(self._show_later)
+
+    def _show_earlier(self) -> None:
+        """Move the window back by a page, keeping the current top message in place."""
+        assert self.max_rendered_lines is not None
+        old_start = self._window_start
+        start, lines = old_start, 0
+        while (
+            start > 0
+            and old_start - start < REHYDRATE_PAGE
+            and lines < self.max_rendered_lines // 2
+        ):
+            start -= 1
+            lines += self._estimated_lines(start)
+        end = old_start
+        while end < len(self._messages) and (
+            end == old_start or lines + self._estimated_lines(end) <= self.max_rendered_lines
+        ):
+            lines += self._estimated_lines(end)
+            end += 1
+
+        # The window no longer follows new messages, so nothing must be trimmed
+        self.max_lines = None
+        self._rerender_window(start, end, scroll_end=False)
+        top = dict(self._offsets).get(old_start, self._start_line)
+        self.scroll_to(y=top - self._start_line, animate=False, immediate=True)
+        self._rehydrating = False
+
+    def _show_later(self) -> None:
+        """Move the window forward by a page, keeping the current bottom message in place."""
+        assert self.max_rendered_lines is not None
+        old_end = self._window_end
+        end, lines = old_end, 0
+        while (
+            end < len(self._messages)
+            and end - old_end < REHYDRATE_PAGE
+            and lines < self.max_rendered_lines // 2
+        ):
+            lines += self._estimated_lines(end)
+            end += 1
+        start = old_end
+        while start > 0 and (
+            start == old_end
+            or lines + self._estimated_lines(start - 1) <= self.max_rendered_lines
+        ):
+            start -= 1
+            lines += self._estimated_lines(start)
+
+        if end == len(self._messages):
+            self.max_lines = self.max_rendered_lines
+        self._rerender_window(start, end, scroll_end=False)
+        bottom = dict(self._offsets).get(old_end, self._start_line + len(self.lines))
+        height = self.scrollable_content_region.height
+        self.scroll_to(y=bottom - self._start_line - height, animate=False, immediate=True)
+        self._rehydrating = False
+
+    def _show_latest(self) -> None:
+        """Render the latest messages, scroll to the end and follow new messages again."""
+        assert self.max_rendered_lines is not None
+        end = len(self._messages)
+        start, lines = end, 0
+        while start > 0 and (
+            start == end or lines + self._estimated_lines(start - 1) <= self.max_rendered_lines
+        ):
+            start -= 1
+            lines += self._estimated_lines(start)
+        self.max_lines = self.max_rendered_lines
+        self._rerender_window(start, end)
+        self.scroll_end(animate=False, immediate=True)
+
+    def _append(self, msg: StoredMessage) -> int:
+        """Store a message and render it if the window follows new messages.
+
+        A user or assistant message arriving while the user reads earlier messages
+        brings the view back to the latest messages.
+        """
+        following = self._following()
+        self._messages.append(msg)
+        index = len(self._messages) - 1
+        if following:
+            self._window_end = index + 1
+            self._render_at(index)
+        elif msg.kind == "message" and msg.role in ("user", "assistant"):
+            self._show_latest()
+        return index
 
     def add_message(
         self,
@@ -98,8 +262,7 @@ class MessageView(RichLog):
         tokens: int = 0,
     ) -> None:
         """Add a message to the view."""
-        self.total_tokens += tokens
-        ts = get_timestamp()
+        ts = sys.intern(get_timestamp())
 
         msg = StoredMessage(
             kind="message",
@@ -108,8 +271,7 @@ class MessageView(RichLog):
             tokens=tokens,
             timestamp=ts,
         )
-        self._messages.append(msg)
-        self._render_message(msg)
+        self._append(msg)
 
     def add_code_block(
         self,
@@ -117,18 +279,63 @@ class MessageView(RichLog):
         description: str,
         result: str | None = None,
     ) -> None:
-        """Add a code execution block to the view."""
+        """Add a code execution block to the view.
+
+        Without a result the block is considered running: output can be streamed
+        into it with append_code_output() until finish_code_block() is called.
+        """
+        result_path = None
+        if result is not None:
+            result, result_path = compact_result(result, self._spill)
         msg = StoredMessage(
             kind="code",
+            timestamp=sys.intern(get_timestamp()),
             code=code,
             description=description,
             result=result,
+            result_path=result_path,
         )
-        self._messages.append(msg)
-        self._render_message(msg)
+        index = self._append(msg)
+        if result is None:
+            self._running_index = index
+
+    def append_code_output(self, text: str) -> None:
+        """Stream output of the running code block into the view."""
+        if self._running_index is None:
+            return
+        msg = self._messages[self._running_index]
+        msg.output += text
+        if len(msg.output) > MAX_STORED_OUTPUT:
+            msg.output = msg.output[-MAX_STORED_OUTPUT:]
+        if self._is_rendered(self._running_index):
+            self.write(Text(text.rstrip("\n"), style="dim"))
+
+    def finish_code_block(self, result: str, profile: str | None = None) -> None:
+        """Record the result (and profile, if any) of the running code block."""
+        if self._running_index is None:
+            return
+        index, self._running_index = self._running_index, None
+        msg = self._messages[index]
+        msg.result, msg.result_path = compact_result(result, self._spill)
+        msg.profile = profile
+        if profile and self._is_rendered(index):
+            self.write(create_profile_text(profile))
+        if self.show_code_results and self._is_rendered(index):
+            result_text = Text()
+            result_text.append("Result: ", style="bold")
+            display_result = result if len(result) < 500 else result[:500] + "..."
+            result_text.append(display_result, style="green")
+            self.write(result_text)
+
+    def snapshot(self) -> list[StoredMessage]:
+        """Return the stored messages, e.g. for exporting the transcript."""
+        return list(self._messages)
 
     def clear_history(self) -> None:
         """Clear both the view and message history."""
         self._messages.clear()
-        self.total_tokens = 0
-        self.clear()
+        self._running_index = None
+        self._spill.clear()
+        self._line_counts.clear()
+        self.max_lines = self.max_rendered_lines
+        self._rerender_window(0, 0)
@@ -20,11 +20,24 @@ def get_timestamp(fmt: str = "%H:%M:%S") -> str:
     return datetime.now().strftime(fmt)
 
 
+def create_profile_text(profile: str) -> Text:
+    """Format a snippet profile: summary line in bold, top functions dimmed."""
+    summary, _, top = profile.partition("\n")
+    text = Text()
+    text.append("⏱ ", style="bold")
+    text.append(summary, style="bold blue")
+    if top:
+        text.append("\n" + top, style="dim")
+    return text
+
+
 def create_code_panel(
     code: str,
     description: str,
     result: str | None = None,
     show_result: bool = False,
+    output: str | None = None,
+    profile: str | None = None,
 ) -> Panel:
     """Create a Rich Panel for displaying code.
 
@@ -33,6 +46,8 @@ def create_code_panel(
         description: Description of what the code does.
         result: Execution result (optional).
         show_result: Whether to show the result.
+        output: Captured stdout/stderr of the execution (optional).
+        profile: Profile of the execution: summary line, then top functions (optional).
 
     Returns:
         A Rich Panel with syntax-highlighted code.
@@ -54,6 +69,20 @@ def create_code_panel(
     # Build panel content
     parts: list[Text | Syntax] = [header, Text(""), syntax]
 
+    # Add captured output (tail only, it can be arbitrarily long)
+    if output:
+        parts.append(Text(""))
+        output_text = Text()
+        output_text.append("Output:\n", style="bold")
+        display_output = output if len(output) < 1000 else "..." + output[-1000:]
+        output_text.append(display_output.rstrip("\n"), style="dim")
+        parts.append(output_text)
+
+    # Add profile if the snippet was profiled
+    if profile:
+        parts.append(Text(""))
+        parts.append(create_profile_text(profile))
+
     # Add result if enabled and available
     if show_result and result is not None:
         parts.append(Text(""))
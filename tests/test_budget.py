@@ -0,0 +1,40 @@
+"""Tests for budgeted agent turns."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from caducode.budget import Budget, run_turn
+from caducode.failures import FailureTracker
+
+
+def test_repeated_failure_stops_turn_and_keeps_history() -> None:
+    def always_fail(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[ToolCallPart("run_python", {"code": "1/0"})])
+
+    agent: Agent[None, str] = Agent(FunctionModel(always_fail))
+    failures = FailureTracker(max_repeated=2, extra_before_stop=1)
+
+    @agent.tool
+    def run_python(ctx: RunContext[None], code: str) -> list[Any]:
+        result = ["Exception raised:\nTraceback ...\nZeroDivisionError: division by zero"]
+        return failures.check(ctx.run_id, result)
+
+    turn = asyncio.run(run_turn(agent, "divide", Budget()))
+
+    assert turn.stopped is not None
+    assert "3 times in a row" in turn.stopped
+    returns = [
+        part
+        for message in turn.messages
+        for part in message.parts
+        if isinstance(part, ToolReturnPart)
+    ]
+    assert len(returns) == 2
+    # The unanswered third call is dropped so the next turn can continue
+    assert not isinstance(turn.messages[-1], ModelResponse)
@@ -0,0 +1,37 @@
+"""Tests for the model response cache."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from typing import Any
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, ToolReturnPart
+from pydantic_ai.models import ModelRequestParameters
+
+from caducode.cache import request_key
+
+
+def _key(content: Any, tool_call_id: str, timestamp: datetime) -> str:
+    messages: list[ModelMessage] = [
+        ModelRequest(
+            parts=[ToolReturnPart("run_python", content, tool_call_id, timestamp=timestamp)],
+            run_id=tool_call_id,
+        )
+    ]
+    return request_key("qwen3", messages, None, ModelRequestParameters())
+
+
+def test_key_ignores_message_metadata() -> None:
+    content = [{"rows": 10}]
+    first = _key(content, "call-1", datetime(2024, 1, 1, tzinfo=UTC))
+    second = _key(content, "call-2", datetime(2026, 1, 1, tzinfo=UTC))
+
+    assert first == second
+
+
+def test_key_keeps_volatile_names_in_content() -> None:
+    timestamp = datetime(2024, 1, 1, tzinfo=UTC)
+    first = _key([{"timestamp": "2024-01-01", "usage": 10}], "call-1", timestamp)
+    second = _key([{"timestamp": "2026-01-01", "usage": 99}], "call-1", timestamp)
+
+    assert first != second
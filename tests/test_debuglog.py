@@ -0,0 +1,35 @@
+"""Tests for the background debug log."""
+
+from __future__ import annotations
+
+import pytest
+
+from caducode.debuglog import DebugLog
+from caducode.execution import execute_python
+from caducode.printer import Printer, console
+
+
+def test_console_debug_log_bypasses_snippet_output(capfd: pytest.CaptureFixture[str]) -> None:
+    debug_log = DebugLog.to_console(console)
+    printer = Printer(show_code=False, debug_log=debug_log)
+    streamed: list[str] = []
+
+    execute_python("import time\n_return(1)\ntime.sleep(0.2)", printer, on_output=streamed.append)
+    debug_log.close()
+
+    assert "[DEBUG" not in "".join(streamed)
+    out = capfd.readouterr().out
+    assert "[DEBUG SNIPPET]" in out
+    assert "[DEBUG _return] 1" in out
+
+
+def test_emit_snapshots_lists() -> None:
+    lines: list[str] = []
+    debug_log = DebugLog(lines.extend)
+    value = [1, 2]
+
+    debug_log.emit("VALUE", value)
+    value.append(3)
+    debug_log.close()
+
+    assert lines[0].endswith("[DEBUG VALUE] [1, 2]")
@@ -0,0 +1,66 @@
+"""Tests for the in-process execution backend."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from caducode.execution import (
+    UNDEFINED_NAMES_PREFIX,
+    InProcessExecutor,
+    OutputStream,
+    exec_globals,
+    execute_python,
+)
+from caducode.printer import Printer
+
+
+def test_reset_waits_for_running_snippet() -> None:
+    executor = InProcessExecutor()
+    printer = Printer(show_code=False)
+    result: list[Any] = []
+    code = "value = 1\nimport time\ntime.sleep(0.3)\n_return(value)"
+    thread = threading.Thread(target=lambda: result.extend(executor.execute(code, printer)))
+    thread.start()
+    time.sleep(0.1)
+
+    executor.reset()
+    thread.join()
+
+    assert result == [1]
+    assert "value" not in exec_globals
+
+
+def test_buffered_output_is_flushed_by_timer() -> None:
+    chunks: list[tuple[float, str]] = []
+    start = time.monotonic()
+    stream = OutputStream(lambda text: chunks.append((time.monotonic() - start, text)))
+
+    stream.write("step 1\n")
+    stream.write("step 2: building\n")
+    time.sleep(0.5)
+
+    assert [text for _, text in chunks] == ["step 1\n", "step 2: building\n"]
+    assert chunks[1][0] < 0.3
+
+
+def test_undefined_names_are_flagged_before_running() -> None:
+    output: list[str] = []
+    code = "print('started')\n_return(missing_name)"
+
+    result = execute_python(code, Printer(show_code=False), on_output=output.append)
+
+    assert output[0] == f"⚠ {UNDEFINED_NAMES_PREFIX}missing_name\n"
+    assert "started" in "".join(output[1:])
+    assert f"{UNDEFINED_NAMES_PREFIX}missing_name" in result[0]
+
+
+def test_star_imports_are_not_flagged() -> None:
+    output: list[str] = []
+
+    execute_python(
+        "from os.path import *\n_return(join('a', 'b'))", Printer(), on_output=output.append
+    )
+
+    assert not any(UNDEFINED_NAMES_PREFIX in text for text in output)
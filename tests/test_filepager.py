@@ -0,0 +1,67 @@
+"""Tests for the mmap-backed file helpers."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from caducode.filepager import _lines, _search, _tail
+
+SOURCE = """import os
+
+
+def main():
+    pass
+
+    x = 1
+def helper():  # pass
+    return os.getcwd()
+"""
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    path = tmp_path / "app.py"
+    path.write_text(SOURCE)
+    return path
+
+
+def test_search_anchors_match_line_boundaries(source: Path) -> None:
+    assert _search(source, r"^def ") == [(4, "def main():"), (8, "def helper():  # pass")]
+    assert _search(source, r"pass$") == [(5, "    pass"), (8, "def helper():  # pass")]
+    assert _search(source, r"^$") == [(2, ""), (3, ""), (6, "")]
+
+
+def test_search_reports_the_line_of_the_match(source: Path) -> None:
+    # \s can match the newline ending line 6, but grep reports line 7
+    assert _search(source, r"\s+x") == [(7, "    x = 1")]
+    assert _search(source, r"main\(\):\s+pass") == []
+
+
+def test_search_limit(source: Path) -> None:
+    assert _search(source, r"def", limit=1) == [(4, "def main():")]
+
+
+def test_lines_and_tail(source: Path) -> None:
+    assert _lines(source, 4, 5) == "def main():\n    pass\n"
+    assert _tail(source, 2) == "def helper():  # pass\n    return os.getcwd()\n"
+
+
+@pytest.mark.skipif(not Path("/proc/self/status").exists(), reason="needs procfs")
+def test_files_reporting_no_size_are_read() -> None:
+    assert Path("/proc/self/status").stat().st_size == 0
+
+    assert _lines("/proc/self/status", 1, 1).startswith("Name:")
+    assert _search("/proc/self/status", r"^Pid:")[0][1].startswith("Pid:")
+    assert _tail("/proc/self/status", 1)
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="needs FIFOs")
+def test_fifo_is_rejected(tmp_path: Path) -> None:
+    fifo = tmp_path / "fifo"
+    os.mkfifo(fifo)
+
+    with pytest.raises(OSError, match="Not a regular file"):
+        _lines(fifo, 1, 1)
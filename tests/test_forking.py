@@ -0,0 +1,66 @@
+"""Tests for the fork execution backend."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+
+from caducode.execution import CancelToken
+from caducode.forking import WORKER_REPLACED, ForkExecutor
+from caducode.printer import Printer
+
+
+@pytest.fixture
+def executor() -> Iterator[ForkExecutor]:
+    executor = ForkExecutor()
+    yield executor
+    executor.close()
+
+
+def test_cancel_token_running_while_worker_runs(executor: ForkExecutor) -> None:
+    cancel = CancelToken()
+    result: list[Any] = []
+    code = "import time\nfor _ in range(100):\n    time.sleep(0.1)"
+    thread = threading.Thread(
+        target=lambda: result.extend(executor.execute(code, Printer(), cancel=cancel))
+    )
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not cancel.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cancel.running
+
+    time.sleep(0.3)
+    cancel.cancel()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert not cancel.running
+    assert result[-1] == "Execution cancelled by user"
+
+
+def test_dead_worker_is_replaced(executor: ForkExecutor) -> None:
+    printer = Printer()
+    executor.execute("x = 1", printer)
+
+    assert executor.execute("import os\nos._exit(1)", printer) == [WORKER_REPLACED]
+    result = executor.execute("_return('x' in globals())", printer)
+
+    assert result == [False]
+
+
+def test_output_streams_during_long_step(executor: ForkExecutor) -> None:
+    chunks: list[tuple[float, str]] = []
+    start = time.monotonic()
+    code = "import time\nprint('step 1')\nprint('step 2')\ntime.sleep(1)"
+
+    executor.execute(
+        code, Printer(), on_output=lambda text: chunks.append((time.monotonic() - start, text))
+    )
+
+    assert "".join(text for _, text in chunks) == "step 1\nstep 2\n"
+    assert chunks[-1][0] < 0.8
@@ -0,0 +1,40 @@
+"""Tests for the message history widget."""
+
+from __future__ import annotations
+
+import asyncio
+
+from textual.app import App, ComposeResult
+
+from caducode.ui.widgets.message_view import MessageView
+
+
+class _ViewApp(App[None]):
+    def compose(self) -> ComposeResult:
+        yield MessageView(id="messages", max_rendered_lines=40)
+
+
+def test_new_user_message_returns_to_latest_messages() -> None:
+    async def run() -> None:
+        app = _ViewApp()
+        async with app.run_test(size=(80, 24)) as pilot:
+            view = app.query_one(MessageView)
+            for number in range(200):
+                view.add_message("system", f"message {number}")
+            await pilot.pause()
+            # Scroll back until earlier messages are rendered
+            while view._window_start > 100:
+                view.scroll_home(animate=False, immediate=True)
+                view._check_window_top()
+                await pilot.pause()
+            assert not view._following()
+
+            view.add_message("user", "latest question")
+            await pilot.pause()
+
+            assert view._following()
+            assert view.max_lines == 40
+            assert view.scroll_y == view.max_scroll_y
+            assert "latest question" in "".join(strip.text for strip in view.lines)
+
+    asyncio.run(run())
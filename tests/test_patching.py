@@ -0,0 +1,99 @@
+"""Tests for _patch() and _apply_diff()."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from caducode.patching import apply_diff, parse_diff
+
+GIT_DIFF = """diff --git a/x.txt b/x.txt
+index 3bd1f0e..2a6d4b2 100644
+--- a/x.txt
++++ b/x.txt
+@@ -1,3 +1,3 @@
+ one
+-two
++TWO
+ three
+diff --git a/y.txt b/y.txt
+index 1191247..f9264f7 100644
+--- a/y.txt
++++ b/y.txt
+@@ -1,2 +1,3 @@
+ alpha
++beta
+ gamma
+"""
+
+NEW_FILE_DIFF = """diff --git a/x.txt b/x.txt
+index 3bd1f0e..4cb29ea 100644
+--- a/x.txt
++++ b/x.txt
+@@ -3 +3 @@
+-three
++3
+diff --git a/new.txt b/new.txt
+new file mode 100644
+index 0000000..b1e6722
+--- /dev/null
++++ b/new.txt
+@@ -0,0 +1,2 @@
++first
++second
+
+"""
+
+
+def test_multi_file_git_diff(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    Path("x.txt").write_text("one\ntwo\nthree\n")
+    Path("y.txt").write_text("alpha\ngamma\n")
+
+    report = apply_diff(GIT_DIFF)
+
+    assert report.splitlines() == [
+        "patched x.txt: 1 hunk (-1 +1 lines)",
+        "patched y.txt: 1 hunk (-0 +1 lines)",
+    ]
+    assert (tmp_path / "x.txt").read_text() == "one\nTWO\nthree\n"
+    assert (tmp_path / "y.txt").read_text() == "alpha\nbeta\ngamma\n"
+
+
+def test_git_diff_creating_a_file(tmp_path: Path) -> None:
+    (tmp_path / "x.txt").write_text("one\ntwo\nthree\n")
+
+    apply_diff(NEW_FILE_DIFF, tmp_path)
+
+    assert (tmp_path / "x.txt").read_text() == "one\ntwo\n3\n"
+    assert (tmp_path / "new.txt").read_text() == "first\nsecond\n"
+
+
+def test_extended_headers_and_trailing_blank_lines_stay_out_of_hunks() -> None:
+    files = parse_diff(NEW_FILE_DIFF)
+
+    assert [(f.old_path, f.new_path) for f in files] == [
+        ("a/x.txt", "b/x.txt"),
+        ("/dev/null", "b/new.txt"),
+    ]
+    assert (files[0].hunks[0].old, files[0].hunks[0].new) == (["three"], ["3"])
+    assert (files[1].hunks[0].old, files[1].hunks[0].new) == ([], ["first", "second"])
+
+
+def test_blank_line_inside_hunk_is_context(tmp_path: Path) -> None:
+    (tmp_path / "z.py").write_text("a = 1\n\nb = 2\n")
+    diff = "--- z.py\n+++ z.py\n@@ -1,3 +1,3 @@\n a = 1\n\n-b = 2\n+b = 3\n"
+
+    apply_diff(diff, tmp_path)
+
+    assert (tmp_path / "z.py").read_text() == "a = 1\n\nb = 3\n"
+
+
+def test_pure_insertion_goes_after_its_line(tmp_path: Path) -> None:
+    (tmp_path / "n.txt").write_text("1\n2\n3\n")
+    diff = "--- n.txt\n+++ n.txt\n@@ -0,0 +1 @@\n+first\n@@ -2,0 +4 @@\n+x\n"
+
+    apply_diff(diff, tmp_path)
+
+    assert (tmp_path / "n.txt").read_text() == "first\n1\n2\nx\n3\n"
@@ -0,0 +1,31 @@
+"""Tests for streaming snippet output through the Rich printer."""
+
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+import pytest
+
+from caducode.execution import execute_python
+from caducode.printer import Printer
+
+
+def test_print_in_snippet_streams_to_terminal(capfd: pytest.CaptureFixture[str]) -> None:
+    printer = Printer(show_timestamps=False)
+    result: list[Any] = []
+
+    def run() -> None:
+        code = "print('hello')\nprint('world')\n_return(1)"
+        result.extend(execute_python(code, printer, on_output=printer.output))
+
+    # Printing back into the redirected stdout used to recurse without end
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+
+    assert result == [1]
+    out = capfd.readouterr().out
+    assert "hello\nworld\n" in out
+    assert "→ 1" in out
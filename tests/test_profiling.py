@@ -0,0 +1,44 @@
+"""Tests for snippet profiling."""
+
+from __future__ import annotations
+
+from caducode.profiling import ProfileOptions, Profiler, profile_call
+
+MB = 1024 * 1024
+# Frames of the profiler that must not be listed as the profiled code's
+PROFILER_FRAMES = (
+    "caducode/profiling.py",
+    "thread_time",
+    "perf_counter",
+    "__init__",
+    "_tracemalloc",
+)
+
+
+def _work() -> list[str]:
+    return sorted(str(i) for i in range(20000))
+
+
+def _allocate() -> int:
+    return len(bytearray(4 * MB))
+
+
+def test_profile_call_nests_in_profiler() -> None:
+    with Profiler(ProfileOptions(top=10)) as outer:
+        _, report = profile_call(_work, (), {})
+
+    for top in (report.top, outer.report.top):
+        assert any("_work" in line for line in top)
+        text = "\n".join(top)
+        for frame in PROFILER_FRAMES:
+            assert frame not in text
+
+
+def test_nested_profiler_keeps_outer_peak() -> None:
+    with Profiler(ProfileOptions()) as outer:
+        big = bytearray(16 * MB)
+        del big
+        _, report = profile_call(_allocate, (), {}, top=0)
+
+    assert report.peak_bytes is not None and 4 * MB <= report.peak_bytes < 8 * MB
+    assert outer.report.peak_bytes is not None and outer.report.peak_bytes >= 16 * MB
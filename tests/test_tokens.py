@@ -0,0 +1,96 @@
+"""Tests for token accounting."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.usage import RequestUsage
+
+from caducode.cache import CachedModel, ResponseCache
+from caducode.config import create_ollama_model
+from caducode.tokens import AccountingModel, TokenAccounting, TokenCounter, context_entries
+
+
+def _history() -> list[ModelMessage]:
+    return [
+        ModelRequest(parts=[UserPromptPart("What is here?")]),
+        ModelResponse(parts=[
+            ToolCallPart(
+                "run_python",
+                {"code": "import os\nos.listdir()", "description": "List files"},
+                tool_call_id="c1",
+            ),
+        ]),
+        ModelRequest(parts=[
+            ToolReturnPart("run_python", ["a.py", "b.py"] * 50, tool_call_id="c1"),
+        ]),
+    ]
+
+
+def test_tool_results_are_labelled_with_their_call() -> None:
+    entries = context_entries(_history(), None, TokenCounter())
+
+    assert [(entry.index, entry.kind, entry.label) for entry in entries] == [
+        (0, "user", "What is here?"),
+        (1, "tool call", "List files"),
+        (2, "tool result", "List files"),
+    ]
+
+
+def test_reported_usage_calibrates_estimates() -> None:
+    accounting = TokenAccounting(TokenCounter())
+    estimate = accounting.predict(_history())
+    estimated = {entry.label: entry.tokens for entry in accounting.entries}
+
+    accounting.record(RequestUsage(input_tokens=2 * estimate, output_tokens=7))
+
+    assert accounting.actual == 2 * estimate
+    assert accounting.scale == 2.0
+    assert (accounting.prompt_tokens, accounting.completion_tokens) == (2 * estimate, 7)
+    biggest = accounting.top(1)[0]
+    assert biggest.kind == "tool result"
+    assert biggest.tokens == 2 * estimated["List files"]
+    # The next prompt is estimated with the calibration
+    assert accounting.predict(_history()) == 2 * estimate
+
+
+def test_cached_responses_are_not_accounted(tmp_path: Path) -> None:
+    def answer(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        return ModelResponse(
+            parts=[TextPart("Hello")], usage=RequestUsage(input_tokens=100, output_tokens=5)
+        )
+
+    accounting = TokenAccounting(TokenCounter())
+    model = CachedModel(
+        AccountingModel(FunctionModel(answer), accounting), ResponseCache(tmp_path)
+    )
+    agent: Agent[None, str] = Agent(model)
+
+    asyncio.run(agent.run("Hi"))
+    scale = accounting.scale
+    asyncio.run(agent.run("Hi"))
+
+    assert accounting.requests == 1
+    assert accounting.prompt_tokens == 100
+    assert accounting.scale == scale
+
+
+def test_ollama_model_accounts_inside_the_cache(tmp_path: Path) -> None:
+    model = create_ollama_model(
+        "http://localhost:11434", "qwen3", ResponseCache(tmp_path), TokenAccounting(TokenCounter())
+    )
+
+    assert isinstance(model, CachedModel)
+    assert isinstance(model.wrapped, AccountingModel)
@@ -0,0 +1,22 @@
+"""Tests for transcript export."""
+
+from __future__ import annotations
+
+import io
+
+from caducode.transcript import StoredMessage, write_html
+
+
+def test_html_export_escapes_raw_html() -> None:
+    message = StoredMessage(
+        kind="message",
+        role="assistant",
+        content="Done <script>alert(1)</script>\n\n<img src=x onerror=alert(1)>",
+    )
+    fp = io.StringIO()
+    write_html([message], fp)
+    page = fp.getvalue()
+
+    assert "<script>alert" not in page
+    assert "<img" not in page
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in page